@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+import player.ai as ai
+from board import Board
+from gameplay.base import board_classes
+
+default_corpus_path = os.path.join(os.path.dirname(__file__), "corpus", "v1.json")
+
+# SearchEngine attributes and module settings of every engine variant
+variants = {
+    "minimax": {"algorithm": "minimax"},
+    "pvs": {"algorithm": "pvs"},
+    "minimax-copy": {"algorithm": "minimax", "inplace_search": False},
+    "minimax-bitboard": {"algorithm": "minimax", "board_backend": "bitboard"},
+    "minimax-no-threat-pruning": {"algorithm": "minimax", "threat_pruning": False},
+    "minimax-symmetric-tt": {"algorithm": "minimax", "symmetric_tt": True},
+}
+
+
+def build_board(moves: list[list[int]], board_class: type[Board] = Board) -> Board:
+    """
+    :param moves: [x, y, color] of every move from the empty board
+    """
+    board = board_class()
+    for x, y, color in moves:
+        board = board.get_board_after_move(x, y, color)
+        board.update_double_free_three_count_and_check_if_violated(
+            ai.free_three_counter
+        )
+    board.parent = None
+    return board
+
+
+def load_corpus(path: str) -> dict:
+    """
+    Corpus is a json file with "version" and "positions", every position has
+    "name", "category" and either "moves" from the empty board or "dump",
+    a path of a Board.dump file relative to the corpus.
+    """
+    with open(path) as f:
+        corpus = json.load(f)
+
+    for position in corpus["positions"]:
+        if "dump" in position:
+            board = Board.load(os.path.join(os.path.dirname(path), position["dump"]))
+            position["moves"] = None
+            position["board"] = board
+    return corpus
+
+
+def get_position_board(position: dict, board_backend: str) -> Board:
+    if position["moves"] is None:
+        return position["board"]
+    return build_board(position["moves"], board_classes[board_backend])
+
+
+def get_peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on linux and in bytes on macos
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def to_json_score(score: float) -> float | str:
+    return float(score) if np.isfinite(score) else str(score)
+
+
+def get_child_time(board: Board, color: int, repeat: int = 5) -> float:
+    """
+    :return: seconds to create the board after one move of color, the fastest
+        of repeat runs over all candidate moves
+    """
+    moves = board.get_candidate_moves()
+    times = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        for x, y in moves:
+            board.get_board_after_move(x, y, color)
+        times.append((time.perf_counter() - time_start) / len(moves))
+    return min(times)
+
+
+def run_variant(
+    variant_name: str, corpus: dict, depths: list[int], workers: int
+) -> list[dict]:
+    settings = variants[variant_name]
+    engine = ai.SearchEngine()
+    engine.max_workers = workers
+    engine.algorithm = settings.get("algorithm", engine.algorithm)
+    engine.inplace_search = settings.get("inplace_search", engine.inplace_search)
+    threat_pruning = ai.threat_pruning
+    ai.threat_pruning = settings.get("threat_pruning", threat_pruning)
+    symmetric_tt = ai.symmetric_tt
+    ai.symmetric_tt = settings.get("symmetric_tt", symmetric_tt)
+    engine.start()
+
+    results = []
+    try:
+        for position in corpus["positions"]:
+            board = get_position_board(position, settings.get("board_backend", "array"))
+            color = -board.last_move_color if board.last_move_color else 1
+            child_time = get_child_time(board, color)
+
+            for depth in depths:
+                # every search starts cold, so runs do not depend on the order
+                ai.transposition_table.clear()
+                ai.move_ordering.clear()
+                nodes_before = ai.nodes_searched
+
+                time_start = time.perf_counter()
+                score, move = engine.search(board, color, depth)
+                wall_time = time.perf_counter() - time_start
+
+                nodes = ai.nodes_searched - nodes_before
+                tt_stats = ai.transposition_table.stats()
+                results.append(
+                    {
+                        "variant": variant_name,
+                        "position": position["name"],
+                        "category": position["category"],
+                        "depth": depth,
+                        "nodes": nodes,
+                        "nodes_per_sec": nodes / wall_time,
+                        "wall_time": wall_time,
+                        "tt_hit_rate": tt_stats["hit_rate"],
+                        "tt_hits": tt_stats["hits"],
+                        "tt_misses": tt_stats["misses"],
+                        "tt_symmetric_hit_rate": tt_stats["symmetric_hit_rate"],
+                        "move": None if move is None else [int(move[0]), int(move[1])],
+                        "score": to_json_score(score),
+                        "child_time_us": child_time * 1e6,
+                        "peak_rss_bytes": get_peak_rss_bytes(),
+                    }
+                )
+    finally:
+        engine.close()
+        ai.threat_pruning = threat_pruning
+        ai.symmetric_tt = symmetric_tt
+
+    return results
+
+
+def summarize(results: list[dict]) -> dict:
+    summary = {}
+    for result in results:
+        variant_summary = summary.setdefault(
+            result["variant"], {"nodes": 0, "wall_time": 0.0, "child_time_us": []}
+        )
+        variant_summary["nodes"] += result["nodes"]
+        variant_summary["wall_time"] += result["wall_time"]
+        variant_summary["child_time_us"].append(result["child_time_us"])
+
+    for variant_summary in summary.values():
+        variant_summary["nodes_per_sec"] = (
+            variant_summary["nodes"] / variant_summary["wall_time"]
+        )
+        variant_summary["child_time_us"] = float(
+            np.mean(variant_summary["child_time_us"])
+        )
+    return summary
+
+
+def find_regressions(report: dict, baseline: dict, max_slowdown: float) -> list[str]:
+    """
+    :return: descriptions of variants whose nodes per second dropped by more
+        than max_slowdown (fraction) against baseline
+    """
+    regressions = []
+    for variant_name, variant_summary in report["summary"].items():
+        baseline_summary = baseline["summary"].get(variant_name)
+        if baseline_summary is None:
+            continue
+        ratio = variant_summary["nodes_per_sec"] / baseline_summary["nodes_per_sec"]
+        if ratio < 1 - max_slowdown:
+            regressions.append(
+                f"{variant_name}: {variant_summary['nodes_per_sec']:.0f} nodes/s, "
+                f"{baseline_summary['nodes_per_sec']:.0f} in baseline"
+            )
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Searches every corpus position with every engine variant "
+        "at fixed depths and prints the measurements as json",
+    )
+    parser.add_argument("--corpus", type=str, default=default_corpus_path)
+    parser.add_argument("--depths", type=int, nargs="+", default=[2, 3])
+    parser.add_argument(
+        "--variants",
+        type=str,
+        nargs="+",
+        choices=list(variants),
+        default=["minimax", "pvs"],
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="search processes, more than 1 makes node counts irreproducible",
+    )
+    parser.add_argument("--output", "-o", type=str, default=None)
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="report of a previous run"
+    )
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=0.1,
+        dest="max_slowdown",
+        help="allowed drop of nodes/s against baseline, exit code is 1 if exceeded",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    corpus = load_corpus(args.corpus)
+
+    results = []
+    for variant_name in args.variants:
+        results += run_variant(variant_name, corpus, args.depths, args.workers)
+
+    report = {
+        "corpus": os.path.basename(args.corpus),
+        "corpus_version": corpus["version"],
+        "depths": args.depths,
+        "workers": args.workers,
+        "results": results,
+        "summary": summarize(results),
+        "peak_rss_bytes": get_peak_rss_bytes(),
+    }
+
+    report_json = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(report_json + "\n")
+    else:
+        print(report_json)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline, args.max_slowdown)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
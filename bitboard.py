@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import sys
+from typing import Callable
+
+import numpy as np
+
+from board import Board, color_index, with_color_count, zobrist_stones
+
+# bit of cell (x, y) is x * row_width + y, the extra always empty bit at the end
+# of every row stops horizontal and diagonal shifts from wrapping to next row
+row_width = Board.size + 1
+
+direction_shifts = (1, row_width, row_width + 1, row_width - 1)
+
+
+def build_board_mask() -> int:
+    result = 0
+    for x in range(Board.size):
+        result |= ((1 << Board.size) - 1) << (x * row_width)
+    return result
+
+
+board_mask = build_board_mask()
+
+
+def get_bit(x: int, y: int) -> int:
+    return 1 << (int(x) * row_width + int(y))
+
+
+def shift(bits: int, n: int) -> int:
+    """
+    Moves every stone n cells back along the direction (bit i gets value of bit i + n)
+    """
+    return bits >> n if n >= 0 else (bits << -n) & board_mask
+
+
+def position_to_bits(position: np.ndarray, color: int) -> int:
+    padded = np.zeros((Board.size, row_width), dtype=bool)
+    padded[:, : Board.size] = position == color
+    return int.from_bytes(
+        np.packbits(padded.ravel(), bitorder="little").tobytes(), "little"
+    )
+
+
+def has_five(stones: int) -> bool:
+    for s in direction_shifts:
+        run = stones
+        for i in range(1, 5):
+            run &= shift(stones, i * s)
+        if run:
+            return True
+    return False
+
+
+def count_free_threes(own: int, opponent: int) -> float:
+    """
+    Same value as the free three heuristic for own color: for every window of 6
+    cells with empty ends and 3 own stones and 1 empty cell inside, 1 if the
+    inner empty cell is not at the edge of the inner part (_X_XX_, _XX_X_)
+    and 0.5 otherwise (_XXX__, __XXX_).
+    """
+    empty = board_mask & ~(own | opponent)
+    result = 0
+    for s in direction_shifts:
+        ends = empty & shift(empty, 5 * s)
+        if not ends:
+            continue
+        for empty_idx, weight in ((1, 0.5), (2, 1), (3, 1), (4, 0.5)):
+            windows = ends & shift(empty, empty_idx * s)
+            for i in range(1, 5):
+                if i != empty_idx:
+                    windows &= shift(own, i * s)
+            result += weight * windows.bit_count()
+    return result
+
+
+class BitBoard(Board):
+    """
+    Board which additionally keeps stones of every color as bits of an int, so
+    that emptiness, captures, fives and free threes are checked with shifts
+    and masks. The position array is kept in sync for the sliding heuristics.
+    """
+
+    __slots__ = ("stones",)
+
+    def __init__(
+        self,
+        position: np.ndarray | None = None,
+        stones: list[int] | None = None,
+        **kwargs,
+    ):
+        """
+        :param stones: bits of stones of color 1 and -1 of position, built from
+            position if not given
+        """
+        super().__init__(position, **kwargs)
+        self.stones = (
+            stones
+            if stones is not None
+            else [
+                position_to_bits(self.position, 1),
+                position_to_bits(self.position, -1),
+            ]
+        )
+
+    def get_derived_state(self) -> dict:
+        # the move and captured bits are updated by perform_inplace_capture_if_possible
+        return {"stones": self.stones.copy()}
+
+    def get_size_in_bytes(self) -> int:
+        return (
+            super().get_size_in_bytes()
+            + sys.getsizeof(self.stones)
+            + sum(sys.getsizeof(stones) for stones in self.stones)
+        )
+
+    def is_point_empty(self, x: int, y: int) -> bool:
+        return not (self.stones[0] | self.stones[1]) & get_bit(x, y)
+
+    def undo_move(self):
+        x, y = self.from_move
+        move_color_idx = color_index(self.last_move_color)
+        self.stones[move_color_idx] &= ~get_bit(x, y)
+        for cx, cy in self.changed_cells[1:]:
+            self.stones[1 - move_color_idx] |= get_bit(cx, cy)
+
+        super().undo_move()
+
+    def perform_inplace_capture_if_possible(self):
+        x, y = self.from_move
+        move_color = self.position[x, y]
+        own_idx = color_index(move_color)
+        move_bit_idx = int(x) * row_width + int(y)
+
+        self.stones[own_idx] |= 1 << move_bit_idx
+        self.update_candidate_counts(x, y, 1)
+
+        own, opponent = self.stones[own_idx], self.stones[1 - own_idx]
+        self.position.flags.writeable = True
+
+        for s in direction_shifts:
+            for step in (s, -s):
+                end_bit_idx = move_bit_idx + 3 * step
+                if end_bit_idx < 0 or not (own >> end_bit_idx) & 1:
+                    continue
+                captured = (1 << (move_bit_idx + step)) | (
+                    1 << (move_bit_idx + 2 * step)
+                )
+                if opponent & captured != captured:
+                    continue
+
+                self.hash ^= self.zobrist_captures_key(move_color)
+                self.captures = with_color_count(
+                    self.captures, move_color, self.get_captures(move_color) + 1
+                )
+                self.hash ^= self.zobrist_captures_key(move_color)
+                opponent &= ~captured
+                for bit_idx in (move_bit_idx + step, move_bit_idx + 2 * step):
+                    cx, cy = divmod(bit_idx, row_width)
+                    self.hash ^= zobrist_stones[1 - own_idx][cx][cy]
+                    self.position[cx, cy] = self.empty_color
+                    self.update_candidate_counts(cx, cy, -1)
+                    self.changed_cells.append((cx, cy))
+
+        self.stones[1 - own_idx] = opponent
+        self.position.flags.writeable = False
+        return self
+
+    def winner(self, criteria=None) -> int | None:
+        """
+        :param criteria: ignored, fives are found with bit shifts
+        """
+        for color in (1, -1):
+            if self.get_captures(color) >= 5:
+                return color
+
+        for color in (1, -1) if self.last_move_color != -1 else (-1, 1):
+            if has_five(self.stones[color_index(color)]):
+                return color
+
+        return None
+
+    def update_double_free_three_count_and_check_if_violated(
+        self, free_three_counter: Callable[[int, Board], int] = None
+    ) -> bool:
+        """
+        :param free_three_counter: ignored, free threes are counted with bit shifts
+        """
+        if self.move_idx < 8:
+            return False
+
+        color_idx = color_index(self.last_move_color)
+        new_count = count_free_threes(
+            self.stones[color_idx], self.stones[1 - color_idx]
+        )
+
+        is_ok = new_count - self.get_free_threes_count(self.last_move_color) > 1
+
+        self.free_threes_count = with_color_count(
+            self.free_threes_count, self.last_move_color, new_count
+        )
+
+        return is_ok
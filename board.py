@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from hashlib import md5
 import os
+import sys
+from functools import cache
 from typing import Callable, Optional
 
 import joblib
@@ -22,39 +23,167 @@ unary_step_vectors = np.array(
     dtype=int,
 )
 
+unary_steps = unary_step_vectors.tolist()
+
 center_square_points = None
 
+# candidate moves are empty cells at most this many steps away from a stone
+# along one of the 8 directions
+candidate_radius = int(os.getenv("CANDIDATE_RADIUS", "1"))
+
+zobrist_seed = 0x5EED
+zobrist_max_captures = 64
+
+
+def build_zobrist_keys(seed: int = zobrist_seed) -> tuple[list, list, list]:
+    """
+    Random 64-bit keys for incremental position hashing. Seed is fixed so hashes
+    are stable between runs and processes.
+    """
+    rng = np.random.default_rng(seed)
+
+    def keys(*shape):
+        return rng.integers(0, 2**63, size=shape, dtype=np.int64).tolist()
+
+    return (
+        keys(2, Board.size, Board.size),
+        keys(2),
+        keys(2, zobrist_max_captures),
+    )
+
+
+@cache
+def get_candidate_neighbour_indices(radius: int) -> list[np.ndarray]:
+    """
+    :return: for every flat cell index, flat indices of cells at distance 1 to
+        radius from it along the 8 directions
+    """
+    steps = np.concatenate(
+        [unary_step_vectors * distance for distance in range(1, radius + 1)]
+    )
+    result = []
+    for x in range(Board.size):
+        for y in range(Board.size):
+            points = steps + np.array([x, y])
+            points = points[np.all((points >= 0) & (points < Board.size), axis=1)]
+            result.append(points[:, 0] * Board.size + points[:, 1])
+    return result
+
+
+def color_index(color: int) -> int:
+    return 0 if color == 1 else 1
+
+
+def with_color_count(counts: tuple, color: int, value) -> tuple:
+    """
+    Per color counters are (value of color 1, value of color -1) tuples, which are
+    shared between boards and replaced instead of changed
+    """
+    return (value, counts[1]) if color == 1 else (counts[0], value)
+
+
+def get_array_size(array: np.ndarray) -> int:
+    """
+    :return: size of the array object and its data, getsizeof counts the data
+        only if the array owns it
+    """
+    if array.base is None:
+        return sys.getsizeof(array)
+    return sys.getsizeof(array) + array.nbytes
+
+
+def get_all_slots(cls: type) -> list[str]:
+    return [name for c in cls.__mro__ for name in getattr(c, "__slots__", ())]
+
+
+class MoveRecord:
+    """
+    State of a Board before make_move, restored by undo_move
+    """
+
+    __slots__ = (
+        "from_move",
+        "last_move_color",
+        "hash",
+        "h_val",
+        "h_state",
+        "changed_cells",
+        "captures",
+        "free_threes_count",
+    )
+
+    def __init__(self, board: Board):
+        self.from_move = board.from_move
+        self.last_move_color = board.last_move_color
+        self.hash = board.hash
+        self.h_val = board.h_val
+        self.h_state = board.h_state
+        self.changed_cells = board.changed_cells
+        self.captures = board.captures
+        self.free_threes_count = board.free_threes_count
+
 
 class Board:
     empty_color = 0
     size = 19
 
+    __slots__ = (
+        "position",
+        "move_idx",
+        "from_move",
+        "last_move_color",
+        "h_val",
+        "captures",
+        "free_threes_count",
+        "hash",
+        "parent",
+        "changed_cells",
+        "h_state",
+        "undo_stack",
+        "candidate_counts",
+    )
+
     def __init__(
         self,
         position: Optional[np.ndarray] = None,
         move_idx: int = 0,
         from_move: int = None,
         last_move_color: int = None,
-        captures: dict[int, int] = None,
-        free_threes_count: dict[int, int] = None,
-        players_chars: dict[int, str] = None,
+        captures: tuple[int, int] = (0, 0),
+        free_threes_count: tuple[float, float] = (0, 0),
+        zobrist_hash: int = None,
+        parent: Board = None,
+        candidate_counts: np.ndarray = None,
     ):
         if position is not None:
-            self.position = position
+            self.position = position.astype(np.int8, copy=False)
         else:
-            self.position = np.zeros((self.size, self.size), dtype=int)
+            self.position = np.zeros((self.size, self.size), dtype=np.int8)
 
         self.position.flags.writeable = False
-        self.hash = None
         self.move_idx = move_idx
         self.from_move = from_move
         self.last_move_color = last_move_color
         self.h_val = None
-        self.captures = captures.copy() if captures is not None else {}
-        self.free_threes_count = (
-            free_threes_count.copy() if free_threes_count is not None else {}
+        self.captures = captures
+        self.free_threes_count = free_threes_count
+        self.hash = zobrist_hash if zobrist_hash is not None else self.generate_hash()
+
+        # incremental heuristic evaluation: cells changed since parent position
+        # and running heuristic sums, see heuristics.sliding.get_heuristic_state
+        self.parent = parent
+        self.changed_cells = [from_move] if parent is not None else []
+        self.h_state = {}
+
+        # records of make_move for undo_move, created by the first make_move
+        self.undo_stack = None
+
+        # number of stones within candidate_radius of every cell, flat
+        self.candidate_counts = (
+            candidate_counts
+            if candidate_counts is not None
+            else self.count_candidate_neighbours()
         )
-        self.players_chars = players_chars
 
     def is_point_on_board(self, x: int, y: int) -> bool:
         return 0 <= x < self.position.shape[0] and 0 <= y < self.position.shape[1]
@@ -62,14 +191,21 @@ class Board:
     def is_point_empty(self, x: int, y: int) -> bool:
         return self.position[x, y] == self.empty_color
 
+    def get_captures(self, color: int) -> int:
+        return self.captures[color_index(color)]
+
+    def get_free_threes_count(self, color: int) -> float:
+        return self.free_threes_count[color_index(color)]
+
     def winner(self, criteria) -> int | None:
-        for color, n_captures in self.captures.items():
-            if n_captures >= 5:
+        for color in (1, -1):
+            if self.get_captures(color) >= 5:
                 return color
 
+        # sum over the winning windows, more than one for an overline or two fives
         winner = criteria(None, self)
         if winner != self.empty_color:
-            return winner
+            return int(np.sign(winner))
         else:
             return None
 
@@ -83,61 +219,220 @@ class Board:
         result = self.position.copy()
         result.flags.writeable = True
         result[x, y] = color
-        return Board(
+
+        zobrist_hash = (
+            self.hash
+            ^ zobrist_stones[color_index(color)][x][y]
+            ^ self.zobrist_side_key(self.last_move_color)
+            ^ self.zobrist_side_key(color)
+        )
+
+        return self.__class__(
             result,
             move_idx=self.move_idx + 1,
             from_move=(x, y),
             last_move_color=color,
             captures=self.captures,
             free_threes_count=self.free_threes_count,
+            zobrist_hash=zobrist_hash,
+            parent=self,
+            candidate_counts=self.candidate_counts.copy(),
+            **self.get_derived_state(),
         ).perform_inplace_capture_if_possible()
 
-    def perform_inplace_capture_if_possible(self):
+    def make_move(self, x: int, y: int, color: int):
+        """
+        Same as get_board_after_move, but changes this board instead of creating
+        a new one. The change is reverted by undo_move.
+        """
+        if not self.is_point_empty(x, y):
+            raise ValueError("illegal move")
+
+        if self.undo_stack is None:
+            self.undo_stack = []
+        self.undo_stack.append(MoveRecord(self))
+
+        self.position.flags.writeable = True
+        self.position[x, y] = color
+
+        self.hash ^= (
+            zobrist_stones[color_index(color)][x][y]
+            ^ self.zobrist_side_key(self.last_move_color)
+            ^ self.zobrist_side_key(color)
+        )
+        self.move_idx += 1
+        self.from_move = (x, y)
+        self.last_move_color = color
+        self.h_val = None
+        self.h_state = {}
+        self.changed_cells = [(x, y)]
+
+        self.perform_inplace_capture_if_possible()
+
+    def undo_move(self):
+        record = self.undo_stack.pop()
+
+        self.position.flags.writeable = True
         x, y = self.from_move
-        move_color = self.position[x, y]
-        capture_pattern = np.array(
-            [move_color, -move_color, -move_color, move_color], dtype=int
+        self.position[x, y] = self.empty_color
+        for cx, cy in self.changed_cells[1:]:
+            self.position[cx, cy] = -self.last_move_color
+            self.update_candidate_counts(cx, cy, 1)
+        self.position.flags.writeable = False
+        self.update_candidate_counts(x, y, -1)
+
+        self.move_idx -= 1
+        self.from_move = record.from_move
+        self.last_move_color = record.last_move_color
+        self.hash = record.hash
+        self.h_val = record.h_val
+        self.h_state = record.h_state
+        self.changed_cells = record.changed_cells
+        self.captures = record.captures
+        self.free_threes_count = record.free_threes_count
+
+    def get_derived_state(self) -> dict:
+        """
+        :return: constructor arguments of a subclass with state derived from the
+            position, copied to boards made from this one instead of recomputed
+        """
+        return {}
+
+    def copy(self) -> Board:
+        """
+        Independent board with the same position, to be changed with make_move
+        """
+        result = self.__class__(
+            self.position.copy(),
+            move_idx=self.move_idx,
+            from_move=self.from_move,
+            last_move_color=self.last_move_color,
+            captures=self.captures,
+            free_threes_count=self.free_threes_count,
+            zobrist_hash=self.hash,
+            candidate_counts=self.candidate_counts.copy(),
+            **self.get_derived_state(),
         )
+        result.h_val = self.h_val
+        result.h_state = self.h_state.copy()
+        return result
 
-        if move_color not in self.captures:
-            self.captures[move_color] = 0
+    def perform_inplace_capture_if_possible(self):
+        x, y = self.from_move
+        move_color = self.position[x, y]
+        captured_color = -move_color
 
+        self.update_candidate_counts(x, y, 1)
         self.position.flags.writeable = True
 
-        for idx in np.stack(
-            [
-                self.get_point_neighbours_coords_to_all_directions(
-                    x, y, d, filter_by_on_board=False
-                )
-                for d in range(4)
-            ],
-            axis=1,
-        ):
-            idx_t = idx.T
-            try:
-                if np.all(self.position[idx_t[0], idx_t[1]] == capture_pattern):
-                    self.captures[move_color] += 1
-                    self.position[idx_t[0][1:-1], idx_t[1][1:-1]] = self.empty_color
-            except IndexError:
+        for dx, dy in unary_steps:
+            x_end, y_end = x + 3 * dx, y + 3 * dy
+            if not (0 <= x_end < self.size and 0 <= y_end < self.size):
                 continue
+            captured_cells = ((x + dx, y + dy), (x + 2 * dx, y + 2 * dy))
+            if (
+                self.position[x_end, y_end] == move_color
+                and self.position[captured_cells[0]] == captured_color
+                and self.position[captured_cells[1]] == captured_color
+            ):
+                self.hash ^= self.zobrist_captures_key(move_color)
+                self.captures = with_color_count(
+                    self.captures, move_color, self.get_captures(move_color) + 1
+                )
+                self.hash ^= self.zobrist_captures_key(move_color)
+                for cx, cy in captured_cells:
+                    self.hash ^= zobrist_stones[color_index(captured_color)][cx][cy]
+                    self.position[cx, cy] = self.empty_color
+                    self.update_candidate_counts(cx, cy, -1)
+                    self.changed_cells.append((cx, cy))
 
         self.position.flags.writeable = False
         return self
 
+    def count_candidate_neighbours(self) -> np.ndarray:
+        result = np.zeros((self.size * self.size,), dtype=np.int8)
+        for x, y in np.argwhere(self.position != self.empty_color):
+            result[
+                get_candidate_neighbour_indices(candidate_radius)[x * self.size + y]
+            ] += 1
+        return result
+
+    def update_candidate_counts(self, x: int, y: int, delta: int):
+        """
+        :param delta: 1 when a stone is placed on (x, y), -1 when it is removed
+        """
+        self.candidate_counts[
+            get_candidate_neighbour_indices(candidate_radius)[x * self.size + y]
+        ] += delta
+
+    def get_candidate_moves(self) -> np.ndarray:
+        """
+        :return: empty cells near stones and in the center square, sorted, of
+            shape (n, 2)
+        """
+        mask = (self.candidate_counts > 0).reshape((self.size, self.size))
+        center_points = self.get_center_square_points()
+        mask[center_points[:, 0], center_points[:, 1]] = True
+        mask &= self.position == self.empty_color
+        return np.argwhere(mask)
+
+    def get_moves_line_pattern_mask(
+        self, moves: np.ndarray, pattern: list[int]
+    ) -> np.ndarray:
+        """
+        :param moves: array of shape (n, 2)
+        :param pattern: colors of 3 cells next to the move in one of directions,
+            cells outside of the board match none
+        :return: bool array of shape (n,), True for moves with pattern next to them
+        """
+        padded_position = np.pad(self.position, 3, constant_values=2)
+
+        points = (
+            np.asarray(moves, dtype=int)[:, np.newaxis, np.newaxis, :]
+            + 3
+            + unary_step_vectors[np.newaxis, :, np.newaxis, :]
+            * np.arange(1, 4)[np.newaxis, np.newaxis, :, np.newaxis]
+        )
+
+        return np.any(
+            np.all(
+                padded_position[points[..., 0], points[..., 1]]
+                == np.array(pattern, dtype=int),
+                axis=2,
+            ),
+            axis=1,
+        )
+
+    def get_capturing_moves_mask(self, moves: np.ndarray, color: int) -> np.ndarray:
+        """
+        :return: bool array of shape (n,), True for moves of color which capture
+        """
+        return self.get_moves_line_pattern_mask(moves, [-color, -color, color])
+
+    def get_capture_threat_moves_mask(
+        self, moves: np.ndarray, color: int
+    ) -> np.ndarray:
+        """
+        :return: bool array of shape (n,), True for moves of color after which
+            color can capture with the next move
+        """
+        return self.get_moves_line_pattern_mask(
+            moves, [-color, -color, self.empty_color]
+        )
+
     def update_double_free_three_count_and_check_if_violated(
         self, free_three_counter: Callable[[int, Board], int]
     ) -> bool:
         if self.move_idx < 8:
             return False
 
-        if self.last_move_color not in self.free_threes_count:
-            self.free_threes_count[self.last_move_color] = 0
-
         new_count = free_three_counter(self.last_move_color, self)
 
-        is_ok = new_count - self.free_threes_count[self.last_move_color] > 1
+        is_ok = new_count - self.get_free_threes_count(self.last_move_color) > 1
 
-        self.free_threes_count[self.last_move_color] = new_count
+        self.free_threes_count = with_color_count(
+            self.free_threes_count, self.last_move_color, new_count
+        )
 
         return is_ok
 
@@ -172,8 +467,34 @@ class Board:
 
         return center_square_points
 
-    def generate_hash(self):
-        return int(md5(self.position.tobytes()).hexdigest(), 16)
+    def zobrist_captures_key(self, color: int) -> int:
+        n_captures = self.get_captures(color)
+        if n_captures == 0:
+            return 0
+        return zobrist_captures[color_index(color)][
+            min(n_captures, zobrist_max_captures - 1)
+        ]
+
+    @staticmethod
+    def zobrist_side_key(last_move_color: int | None) -> int:
+        if last_move_color is None:
+            return 0
+        return zobrist_side[color_index(last_move_color)]
+
+    def generate_hash(self) -> int:
+        """
+        Full Zobrist hash of the position, side to move and capture counts.
+        Boards made with get_board_after_move update it incrementally instead.
+        """
+        result = self.zobrist_side_key(self.last_move_color)
+
+        for x, y in np.argwhere(self.position != self.empty_color):
+            result ^= zobrist_stones[color_index(self.position[x, y])][x][y]
+
+        for color in (1, -1):
+            result ^= self.zobrist_captures_key(color)
+
+        return result
 
     def __hash__(self):
         if self.hash is None:
@@ -183,19 +504,48 @@ class Board:
     def __eq__(self, other):
         if not isinstance(other, Board):
             return False
-        return (other.position == self.position).all()
+        return self.hash == other.hash and (other.position == self.position).all()
 
-    def __str__(self) -> str:
+    def get_size_in_bytes(self) -> int:
+        """
+        Memory held by this board alone, without its parent and undo records
+        """
+        return (
+            sys.getsizeof(self)
+            + get_array_size(self.position)
+            + get_array_size(self.candidate_counts)
+            + sys.getsizeof(self.hash)
+            + sys.getsizeof(self.changed_cells)
+            + sys.getsizeof(self.h_state)
+            + sum(state.nbytes for state in self.h_state.values())
+        )
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in get_all_slots(type(self))}
+        state["parent"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        # unpickled array may not own its memory, then make_move could not write it
+        self.position = self.position.copy()
+        self.position.flags.writeable = False
+
+    def to_str(self, players_chars: dict[int, str]) -> str:
         board_position_copy = self.position.copy().astype(object)
         board_position_copy.flags.writeable = True
 
-        for color, char in (self.players_chars | {0: "."}).items():
+        for color, char in (players_chars | {0: "."}).items():
             board_position_copy[board_position_copy == color] = char
 
         return tabulate.tabulate(
             board_position_copy, headers="keys", stralign="center", showindex=True
         )
 
+    def __str__(self) -> str:
+        return self.to_str({1: "X", -1: "O"})
+
     def dump(self, suffix: str = ""):
         if not os.path.isdir("./logs"):
             os.makedirs("./logs")
@@ -204,3 +554,6 @@ class Board:
     @staticmethod
     def load(checkpoint_path: str) -> Board:
         return joblib.load(checkpoint_path)
+
+
+zobrist_stones, zobrist_side, zobrist_captures = build_zobrist_keys()
@@ -0,0 +1,4 @@
+from book.builder import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import logging
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+import player.ai as ai
+from board import Board
+from heuristics.sliding import get_batch_heuristic
+from player.book import default_book_path, get_book_entry, write_book
+from symmetry import get_canonical_hash
+
+# first player to move, as in the gameplay
+first_color = -1
+
+
+def get_expanded_moves(
+    engine: ai.SearchEngine,
+    board: Board,
+    color: int,
+    best_move: tuple[int, int],
+    width: int,
+) -> list[tuple[int, int]]:
+    """
+    :return: best_move and the other moves of color with the best heuristic
+        values after them, width moves at most
+    """
+    h_batch = partial(get_batch_heuristic(engine.get_heuristic(color)), -color)
+    moves, h_values = ai.get_next_moves(board, color, h_batch=h_batch)
+    result = [best_move]
+    for x, y in moves[np.argsort(-h_values, kind="stable")].tolist():
+        if len(result) >= width:
+            break
+        if (x, y) != result[0]:
+            result.append((x, y))
+    return result
+
+
+def build_book(
+    engine: ai.SearchEngine, plies: int, width: int, depth: int
+) -> dict[int, tuple]:
+    """
+    Searches positions from the empty board to depth, where every position is
+    followed by its best move and the width - 1 next most promising moves, up
+    to plies moves. Symmetric positions are searched once.
+
+    :return: book entries by key
+    """
+    entries = {}
+    positions = [(Board(), first_color)]
+
+    for ply in range(plies):
+        next_positions = []
+        for board, color in positions:
+            key, _ = get_canonical_hash(board)
+            if key in entries:
+                continue
+
+            time_start = time.monotonic()
+            ai.transposition_table.new_search()
+            ai.move_ordering.new_search()
+            score, move = engine.search(board, color, depth)
+            if move is None:
+                continue
+            move = int(move[0]), int(move[1])
+            _, entries[key] = get_book_entry(board, move, depth, score)
+            print(
+                f"ply {ply}: {len(entries)} positions, {move} scored {score} "
+                f"in {time.monotonic() - time_start:.2f}s",
+                file=sys.stderr,
+            )
+
+            if ply + 1 == plies or score in (np.inf, -np.inf):
+                continue
+            for x, y in get_expanded_moves(engine, board, color, move, width):
+                next_board = board.get_board_after_move(x, y, color)
+                next_board.update_double_free_three_count_and_check_if_violated(
+                    ai.free_three_counter
+                )
+                next_board.parent = None
+                next_positions.append((next_board, -color))
+        positions = next_positions
+
+    return entries
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m book",
+        description="Builds the opening book by searching positions from the "
+        "empty board",
+    )
+    parser.add_argument("--plies", type=int, default=4, help="moves from the start")
+    parser.add_argument(
+        "--width", type=int, default=4, help="moves followed from every position"
+    )
+    parser.add_argument("--depth", type=int, default=5, help="search depth")
+    parser.add_argument("--workers", type=int, default=1, help="search processes")
+    parser.add_argument("--output", "-o", type=str, default=default_book_path)
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args()
+
+    engine = ai.SearchEngine()
+    engine.max_workers = args.workers
+    engine.start()
+    try:
+        entries = build_book(engine, args.plies, args.width, args.depth)
+    finally:
+        engine.close()
+
+    write_book(args.output, entries)
+    print(f"{len(entries)} positions written to {args.output}", file=sys.stderr)
@@ -1,8 +1,16 @@
+import os
 from abc import ABC
+from concurrent.futures import Future, ThreadPoolExecutor
 
+from bitboard import BitBoard
 from board import Board
+from gameplay.record import GameRecordWriter
+from gameplay.utils import clear_previous_game_logs, get_game_record_path
 from heuristics.sliding import Heuristics, build_heuristic
-from player.ai import AIPlayer
+from player.ai import AIPlayer, SearchEngine
+from player.human import HumanPlayer
+
+board_classes = {"array": Board, "bitboard": BitBoard}
 
 
 class BaseGameplay(ABC):
@@ -21,26 +29,101 @@ class BaseGameplay(ABC):
         self.player_1.set_move_getter(self.get_move)
         self.player_2.set_move_getter(self.get_move)
 
+        # shared by AI players and hints, lives until end_game
+        self.search_engine = SearchEngine()
+        self.player_1.set_search_engine(self.search_engine)
+        self.player_2.set_search_engine(self.search_engine)
+
         self.winner_heuristic = build_heuristic(0, Heuristics.bin)
 
+        # moves of the current game, written to logs by a background thread
+        self.game_record = None
+
+        # AI searches which should not block the game loop run in this thread
+        self.search_executor = ThreadPoolExecutor(max_workers=1)
+        self.ponder_future: Future | None = None
+        self.ponder_move_idx = None
+
     def pre_game_init(self):
+        self.search_engine.start()
         self.player_1.start_game()
         self.player_2.start_game()
 
         self.move_idx = 0
+        self.ponder_move_idx = None
         self.current_player_idx = 0
         self.active_player = self.player_1
         self.passive_player = self.player_2
 
         self.game_iterator_instance = self.game_iterator()
-        self.board = Board()
+        self.board = board_classes[os.getenv("BOARD_BACKEND", "array")]()
 
         print(f"player 1: type={type(self.player_1)}, h={type(self.player_1.h)}")
         print(f"player 2: type={type(self.player_2)}, h={type(self.player_2.h)}")
+        print(f"board: {self.board.get_size_in_bytes()} bytes per node")
 
     def end_game(self):
+        self.stop_pondering()
+        self.search_executor.shutdown()
+        self.close_game_record()
         self.player_1.end_game()
         self.player_2.end_game()
+        self.search_engine.close()
+
+    def get_pondering_player(self) -> AIPlayer | None:
+        """
+        :return: AI player with pondering on, if its human opponent is to move
+        """
+        if (
+            isinstance(self.active_player, HumanPlayer)
+            and isinstance(self.passive_player, AIPlayer)
+            and self.passive_player.ponder
+        ):
+            return self.passive_player
+        return None
+
+    def start_pondering(self):
+        """
+        Starts pondering of the AI opponent of a human player, once per move
+        """
+        player = self.get_pondering_player()
+        if (
+            player is None
+            or self.ponder_future is not None
+            or self.ponder_move_idx == self.move_idx
+        ):
+            return
+        self.ponder_move_idx = self.move_idx
+        # stop_pondering may be called before the executor runs ponder
+        player.search_engine.start_searching()
+        self.ponder_future = self.search_executor.submit(
+            player.search_engine.ponder, self.board, player.color
+        )
+
+    def is_pondering(self) -> bool:
+        return self.ponder_future is not None and not self.ponder_future.done()
+
+    def stop_pondering(self):
+        if self.ponder_future is None:
+            return
+        self.search_engine.stop()
+        # raises the exception of pondering, if it failed
+        self.ponder_future.result()
+        self.ponder_future = None
+
+    def start_game_record(self):
+        self.close_game_record()
+        clear_previous_game_logs()
+        self.game_record = GameRecordWriter(get_game_record_path())
+
+    def record_move(self):
+        if self.game_record is not None:
+            self.game_record.add_move(self.board)
+
+    def close_game_record(self, winner_color: int | None = None):
+        if self.game_record is not None:
+            self.game_record.close(winner_color)
+            self.game_record = None
 
     def increment_move_index(self):
         self.move_idx += 1
@@ -49,11 +132,7 @@ class BaseGameplay(ABC):
         self.active_player = self.players[self.current_player_idx]
 
     def get_move_from_ai(self) -> tuple[int, int]:
-        ai_player = AIPlayer(self.active_player.color)
-        ai_player.start_game()
-        move = ai_player.get_move(self.board)
-        ai_player.end_game()
-        return move
+        return self.search_engine.get_move(self.board, self.active_player.color)
 
     def get_move(self, position) -> tuple[int, int]:
         raise NotImplementedError()
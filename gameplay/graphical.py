@@ -1,5 +1,6 @@
 import tkinter
 import tkinter as tk
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from queue import Queue
 from tkinter import Tk
@@ -9,8 +10,8 @@ from PIL import Image, ImageEnhance, ImageTk
 
 from board import Board
 from gameplay.base import BaseGameplay
-from gameplay.utils import clear_previous_game_logs
 from player.human import HumanPlayer
+from player.stats import format_stats
 
 SIZE = 650
 WINDOW_XY = np.array([SIZE, SIZE])
@@ -41,11 +42,13 @@ class VisualGameplay(BaseGameplay):
         self.player_1_frame = None
         self.players_frame = None
         self.move_idx_label = None
+        self.search_stats_label = None
+        self.thinking_label = None
         self.frame = None
 
         self.root = Tk()
         self.root.title("Gomoku")
-        self.root.geometry(f"{WINDOW_XY[0]}x{WINDOW_XY[1] + 100}")
+        self.root.geometry(f"{WINDOW_XY[0]}x{WINDOW_XY[1] + 140}")
 
         self.moves_queue = None
 
@@ -61,6 +64,11 @@ class VisualGameplay(BaseGameplay):
 
         self.game_start_time = None
 
+        # AI moves and hints are searched in search_executor, so the window is
+        # not blocked, and put to moves_queue
+        self.search_future: Future | None = None
+        self.last_search_time = None
+
         self.draw_initial_state()
 
     def draw_initial_state(self):
@@ -69,9 +77,18 @@ class VisualGameplay(BaseGameplay):
             self.frame, text="Move #0", font=("Helvetica", 18, "bold")
         )
         self.move_idx_label.pack(side="top")
+        self.search_stats_label = tk.Label(
+            self.frame, text="", font=("Helvetica", 10), wraplength=WINDOW_XY[0]
+        )
+        self.search_stats_label.pack(side="top")
         controls_frame = tk.Frame(self.frame, width=WINDOW_XY[0] // 2, height=100)
         controls_frame.pack(side="left")
         tk.Button(controls_frame, text="AI help", command=self.ai_help).pack(side="top")
+        tk.Button(controls_frame, text="Move now", command=self.move_now).pack(
+            side="top"
+        )
+        self.thinking_label = tk.Label(controls_frame, text="")
+        self.thinking_label.pack(side="top")
         tk.Button(controls_frame, text="Reset", command=self.reset_game).pack(
             side="top"
         )
@@ -180,10 +197,61 @@ class VisualGameplay(BaseGameplay):
         self.root.destroy()
 
     def ai_help(self):
-        self.moves_queue.put(self.get_move_from_ai())
+        if (
+            isinstance(self.active_player, HumanPlayer)
+            and self.moves_queue.empty()
+            and not self.is_searching()
+        ):
+            self.stop_pondering()
+            self.start_search(self.get_move_from_ai)
+
+    def start_search(self, search, *args):
+        """
+        Runs search(*args) in the search thread, the move it returns is put
+        to moves_queue
+        """
+        self.search_future = self.search_executor.submit(self.run_search, search, *args)
+
+    def run_search(self, search, *args):
+        time_start = datetime.now()
+        move = search(*args)
+        self.last_search_time = datetime.now() - time_start
+        self.moves_queue.put(move)
+
+    def is_searching(self) -> bool:
+        return self.search_future is not None and not self.search_future.done()
+
+    def move_now(self):
+        """
+        Stops the running search, it plays the best move found so far
+        """
+        if self.is_searching():
+            self.search_engine.stop()
+
+    def stop_search(self):
+        self.stop_pondering()
+        if self.is_searching():
+            self.search_engine.stop()
+            self.search_future.exception()
+        self.search_future = None
+
+    def update_thinking_label(self):
+        if self.is_searching() or self.is_pondering():
+            depth, nodes = self.search_engine.get_progress()
+            self.thinking_label.configure(
+                text=f"{'Thinking' if self.is_searching() else 'Pondering'}: "
+                f"depth {depth}, {nodes} nodes"
+            )
+        else:
+            self.thinking_label.configure(text="")
+
+    def end_game(self):
+        self.stop_search()
+        super().end_game()
 
     def reset_game(self):
         self.root.after_cancel(self.after_cb_id)
+        self.stop_search()
         self.frame.destroy()
         self.canvas.destroy()
         self.pre_game_init()
@@ -192,6 +260,7 @@ class VisualGameplay(BaseGameplay):
         self.after_cb_id = self.root.after(100, self.call_game_iteration)
 
     def exit(self):
+        self.stop_search()
         self.root.destroy()
         self.root.quit()
 
@@ -199,9 +268,21 @@ class VisualGameplay(BaseGameplay):
         self.move_idx_label.configure(
             text=f"Move #{self.move_idx // 2} / {self.player_color_str(self.active_player.color)}"
         )
-        if isinstance(self.active_player, HumanPlayer) and self.moves_queue.empty():
+        self.update_thinking_label()
+        if self.search_future is not None and self.search_future.done():
+            # raises the exception of the search, if it failed
+            self.search_future.result()
+            self.search_future = None
+
+        if self.moves_queue.empty():
+            if isinstance(self.active_player, HumanPlayer):
+                if self.search_future is None:
+                    self.start_pondering()
+            elif self.search_future is None:
+                self.start_search(self.active_player.get_move, self.board)
             self.after_cb_id = self.root.after(100, self.call_game_iteration)
         else:
+            self.stop_pondering()
             winner_color = next(self.game_iterator_instance)
             if winner_color is not None:
                 winner_color_name = self.player_color_str(winner_color)
@@ -219,6 +300,9 @@ class VisualGameplay(BaseGameplay):
         if not self.moves_queue.empty():
             print("Queue not empty")
             return
+        if not isinstance(self.active_player, HumanPlayer) or self.is_searching():
+            print("AI is thinking")
+            return
         i = int((event.x - OFFSET + FIELD_SIZE) // STEP_SIZE)
         j = int((event.y - OFFSET + FIELD_SIZE) // STEP_SIZE)
 
@@ -266,15 +350,13 @@ class VisualGameplay(BaseGameplay):
                     self.place_stone(i, j, board.position[i][j])
 
     def game_iterator(self):
-        clear_previous_game_logs()
+        self.start_game_record()
 
         winner_color = None
 
         players_timers = {p.color: [] for p in self.players}
 
         while winner_color is None:
-            self.board.dump(f"at_move_{self.move_idx}")
-
             try:
                 if isinstance(self.active_player, HumanPlayer):
                     total_time_passed = datetime.now() - self.game_start_time
@@ -297,10 +379,10 @@ class VisualGameplay(BaseGameplay):
                         text=f"Mean time: {(time_sum / len(players_timers[self.active_player.color])):.2f}"
                     )
                 else:
-                    time_start = datetime.now()
-                    move_x, move_y = self.active_player.get_move(self.board)
+                    # searched by call_game_iteration in the search thread
+                    move_x, move_y = self.get_move(self.board)
                     players_timers[self.active_player.color].append(
-                        datetime.now() - time_start
+                        self.last_search_time
                     )
                     time_sum = sum(
                         players_timers[self.active_player.color], timedelta()
@@ -311,6 +393,10 @@ class VisualGameplay(BaseGameplay):
                     self.player_timer_labels[self.active_player.color][1].configure(
                         text=f"Mean time: {(time_sum / len(players_timers[self.active_player.color])):.2f}"
                     )
+                    if self.active_player.last_move_stats is not None:
+                        self.search_stats_label.configure(
+                            text=format_stats(self.active_player.last_move_stats)
+                        )
                 board_new = self.board.get_board_after_move(
                     move_x, move_y, self.active_player.color
                 )
@@ -327,16 +413,14 @@ class VisualGameplay(BaseGameplay):
                 continue
 
             self.board = board_new
+            self.record_move()
 
-            for color, n_captures in self.board.captures.items():
-                if color == self.player_1.color:
-                    self.captures_player_1_label.configure(
-                        text=f"Captures: {n_captures * 2}"
-                    )
-                elif color == self.player_2.color:
-                    self.captures_player_2_label.configure(
-                        text=f"Captures: {n_captures * 2}"
-                    )
+            self.captures_player_1_label.configure(
+                text=f"Captures: {self.board.get_captures(self.player_1.color) * 2}"
+            )
+            self.captures_player_2_label.configure(
+                text=f"Captures: {self.board.get_captures(self.player_2.color) * 2}"
+            )
 
             self.draw_stones(self.board)
 
@@ -346,6 +430,7 @@ class VisualGameplay(BaseGameplay):
             if not winner_color:
                 yield None
 
+        self.close_game_record(winner_color)
         yield winner_color
 
     def load_tk_images(self):
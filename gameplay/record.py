@@ -0,0 +1,296 @@
+import os
+import struct
+import threading
+from queue import Queue
+
+import numpy as np
+
+from board import Board
+from heuristics.sliding import Heuristics, build_heuristic
+
+record_magic = b"GMKR"
+record_version = 2
+
+# magic, version, board size, reserved
+file_header = struct.Struct("<4sBBH")
+# number of moves, number of keyframes, winner color or 0, flags, keyframe interval
+game_header = struct.Struct("<HHbBH")
+
+# set when the game is closed and its header is complete
+closed_flag = 1
+
+# a keyframe is stored after every this many moves, 0 for none
+default_keyframe_interval = int(os.getenv("RECORD_KEYFRAME_INTERVAL", "32"))
+
+n_cells = Board.size * Board.size
+keyframe_dtype = np.dtype(
+    [
+        # bits of cells with stones of color 1 and -1
+        ("stones", np.uint8, (2, (n_cells + 7) // 8)),
+        ("captures", np.int8, (2,)),
+        ("free_threes_count", np.float32, (2,)),
+    ]
+)
+
+free_three_counter = build_heuristic(None, Heuristics.free_three, line_len_to_analyze=6)
+
+
+def encode_move(x: int, y: int, color: int, captured_pairs: int) -> int:
+    """
+    :return: 2 bytes: flat cell in bits 0-8, 1 in bit 9 for color 1 and the
+        number of pairs the move captured in bits 10-13
+    """
+    return int(x) * Board.size + int(y) | (color == 1) << 9 | captured_pairs << 10
+
+
+def decode_moves(codes: np.ndarray) -> np.ndarray:
+    """
+    :return: (x, y, color, captured_pairs) of every move, of shape (n, 4)
+    """
+    codes = codes.astype(int)
+    x, y = np.divmod(codes & 0x1FF, Board.size)
+    color = np.where(codes & 0x200, 1, -1)
+    return np.stack((x, y, color, codes >> 10), axis=1)
+
+
+def get_captured_pairs(board: Board) -> int:
+    return (len(board.changed_cells) - 1) // 2
+
+
+def get_keyframe(board: Board) -> np.ndarray:
+    keyframe = np.zeros((), dtype=keyframe_dtype)
+    for i, color in enumerate((1, -1)):
+        keyframe["stones"][i] = np.packbits(board.position.ravel() == color)
+    keyframe["captures"] = board.captures
+    keyframe["free_threes_count"] = board.free_threes_count
+    return keyframe
+
+
+def get_keyframe_board(
+    keyframe: np.ndarray,
+    last_move: np.ndarray,
+    move_idx: int,
+    board_class: type[Board] = Board,
+) -> Board:
+    """
+    :param last_move: decoded move which made the keyframe position
+    """
+    position = np.zeros((n_cells,), dtype=np.int8)
+    for i, color in enumerate((1, -1)):
+        position[np.unpackbits(keyframe["stones"][i], count=n_cells).astype(bool)] = (
+            color
+        )
+    x, y, color, _ = last_move.tolist()
+    return board_class(
+        position.reshape((Board.size, Board.size)),
+        move_idx=move_idx,
+        from_move=(x, y),
+        last_move_color=color,
+        captures=tuple(keyframe["captures"].tolist()),
+        free_threes_count=tuple(keyframe["free_threes_count"].tolist()),
+    )
+
+
+class GameEncoder:
+    """
+    Moves and keyframes of one game, in the layout of a game of a record file
+    """
+
+    def __init__(self, keyframe_interval: int = default_keyframe_interval):
+        self.keyframe_interval = keyframe_interval
+        self.moves = []
+        self.keyframes = []
+
+    def add_move(self, board: Board) -> int:
+        """
+        :param board: board right after the move
+        :return: code of the move
+        """
+        x, y = board.from_move
+        code = encode_move(x, y, board.last_move_color, get_captured_pairs(board))
+        self.moves.append(code)
+        if self.keyframe_interval and board.move_idx % self.keyframe_interval == 0:
+            self.keyframes.append(get_keyframe(board))
+        return code
+
+    def get_header(self, winner: int | None) -> bytes:
+        return game_header.pack(
+            len(self.moves),
+            len(self.keyframes),
+            int(winner or 0),
+            closed_flag,
+            self.keyframe_interval,
+        )
+
+    def get_keyframes_bytes(self) -> bytes:
+        return np.array(self.keyframes, dtype=keyframe_dtype).tobytes()
+
+    def to_bytes(self, winner: int | None) -> bytes:
+        return (
+            self.get_header(winner)
+            + np.array(self.moves, dtype="<u2").tobytes()
+            + self.get_keyframes_bytes()
+        )
+
+
+def write_file_header(f):
+    f.write(file_header.pack(record_magic, record_version, Board.size, 0))
+
+
+def append_games(path: str, games: list[bytes]):
+    """
+    :param games: results of GameEncoder.to_bytes, appended to the record file
+        at path, which is created if it does not exist
+    """
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            write_file_header(f)
+        for game in games:
+            f.write(game)
+
+
+class GameRecordWriter:
+    """
+    Writes one game to a record file while it is played. The game header is
+    written with no moves and completed by close, moves are appended 2 bytes
+    each by a background thread, so the game loop only puts them to a queue.
+    Keyframes are written after the moves on close.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = default_keyframe_interval):
+        self.path = path
+        self.encoder = GameEncoder(keyframe_interval)
+        self.queue = Queue()
+        self.file = open(path, "wb")
+        write_file_header(self.file)
+        self.game_offset = self.file.tell()
+        self.file.write(game_header.pack(0, 0, 0, 0, keyframe_interval))
+        self.thread = threading.Thread(target=self.write_moves, daemon=True)
+        self.thread.start()
+
+    def add_move(self, board: Board):
+        """
+        :param board: board right after the move
+        """
+        self.queue.put(self.encoder.add_move(board))
+
+    def write_moves(self):
+        while True:
+            code = self.queue.get()
+            if code is None:
+                break
+            self.file.write(struct.pack("<H", code))
+            if self.queue.empty():
+                self.file.flush()
+
+    def close(self, winner: int | None = None):
+        """
+        Waits for the queued moves to be written and completes the game
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.file.write(self.encoder.get_keyframes_bytes())
+        self.file.seek(self.game_offset)
+        self.file.write(self.encoder.get_header(winner))
+        self.file.close()
+
+
+class GameArchive:
+    """
+    Memory-mapped record file of any number of games. Only the game headers are
+    read on open, moves and keyframes are read when a game or a position is
+    requested. The last game may be unfinished, then its moves are the rest of
+    the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic, version, board_size, _ = file_header.unpack_from(self.data, 0)
+        if magic != record_magic or version != record_version:
+            raise ValueError(f"{path} is not a game record of version {record_version}")
+        if board_size != Board.size:
+            raise ValueError(f"{path} is a record of board size {board_size}")
+
+        # offset, number of moves, number of keyframes, winner, keyframe interval
+        games = []
+        offset = file_header.size
+        while offset + game_header.size <= len(self.data):
+            n_moves, n_keyframes, winner, flags, keyframe_interval = (
+                game_header.unpack_from(self.data, offset)
+            )
+            if not flags & closed_flag:
+                n_moves = (len(self.data) - offset - game_header.size) // 2
+                n_keyframes = 0
+            games.append((offset, n_moves, n_keyframes, winner, keyframe_interval))
+            offset += (
+                game_header.size + 2 * n_moves + keyframe_dtype.itemsize * n_keyframes
+            )
+        self.games = np.array(games, dtype=np.int64).reshape((-1, 5))
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def get_n_moves(self, game_idx: int) -> int:
+        return int(self.games[game_idx, 1])
+
+    def get_winner(self, game_idx: int) -> int | None:
+        return int(self.games[game_idx, 3]) or None
+
+    def get_move_codes(self, game_idx: int) -> np.ndarray:
+        offset, n_moves = self.games[game_idx, :2]
+        return np.frombuffer(
+            self.data, dtype="<u2", count=n_moves, offset=offset + game_header.size
+        )
+
+    def get_moves(self, game_idx: int) -> np.ndarray:
+        """
+        :return: (x, y, color, captured_pairs) of every move, of shape (n, 4)
+        """
+        return decode_moves(self.get_move_codes(game_idx))
+
+    def get_keyframes(self, game_idx: int) -> np.ndarray:
+        offset, n_moves, n_keyframes = self.games[game_idx, :3]
+        return np.frombuffer(
+            self.data,
+            dtype=keyframe_dtype,
+            count=n_keyframes,
+            offset=offset + game_header.size + 2 * n_moves,
+        )
+
+    def get_board(
+        self, game_idx: int, ply: int, board_class: type[Board] = Board
+    ) -> Board:
+        """
+        :return: board after ply moves, replayed from the last keyframe before it
+        """
+        moves = self.get_moves(game_idx)
+        if not 0 <= ply <= len(moves):
+            raise ValueError(f"game {game_idx} has {len(moves)} moves, not {ply}")
+
+        keyframes = self.get_keyframes(game_idx)
+        keyframe_interval = int(self.games[game_idx, 4])
+        keyframe_idx = (
+            min(ply // keyframe_interval, len(keyframes)) if keyframe_interval else 0
+        )
+        if keyframe_idx > 0:
+            start = keyframe_idx * keyframe_interval
+            board = get_keyframe_board(
+                keyframes[keyframe_idx - 1], moves[start - 1], start, board_class
+            )
+        else:
+            start = 0
+            board = board_class()
+
+        for x, y, color, captured_pairs in moves[start:ply].tolist():
+            board = board.get_board_after_move(x, y, color)
+            board.update_double_free_three_count_and_check_if_violated(
+                free_three_counter
+            )
+            if get_captured_pairs(board) != captured_pairs:
+                raise ValueError(
+                    f"captures of move {board.move_idx} do not match record"
+                )
+            board.parent = None
+        return board
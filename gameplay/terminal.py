@@ -1,12 +1,11 @@
 from datetime import datetime
 
-import joblib
 import numpy as np
 
 from board import Board
 from gameplay.base import BaseGameplay
-from gameplay.utils import clear_previous_game_logs
 from heuristics.sliding import Heuristics, build_heuristic
+from player.stats import format_stats
 
 
 class TerminalGameplay(BaseGameplay):
@@ -38,7 +37,7 @@ class TerminalGameplay(BaseGameplay):
             break
 
     def game_iterator(self):
-        clear_previous_game_logs()
+        self.start_game_record()
 
         winner_color = None
 
@@ -53,11 +52,14 @@ class TerminalGameplay(BaseGameplay):
 
         while winner_color is None:
             self.print_info_before_move(self.board, players_chars)
-            joblib.dump(self.board, f"./logs/board_at_move_{self.move_idx}.joblib")
 
             try:
                 time_start = datetime.now()
-                move_x, move_y = self.active_player.get_move(self.board)
+                self.start_pondering()
+                try:
+                    move_x, move_y = self.active_player.get_move(self.board)
+                finally:
+                    self.stop_pondering()
                 players_timers[self.active_player.color].append(
                     datetime.now() - time_start
                 )
@@ -74,6 +76,7 @@ class TerminalGameplay(BaseGameplay):
                 continue
 
             self.board = board_new
+            self.record_move()
 
             scores = {
                 k: players_hs[k](self.active_player.color, self.board)
@@ -93,17 +96,16 @@ class TerminalGameplay(BaseGameplay):
             self.increment_move_index()
             yield None
 
+        self.close_game_record(winner_color)
         self.print_end_game_info(winner_color, players_chars)
-        self.board.players_chars = players_chars
-        print(self.board, "\n")
+        print(self.board.to_str(players_chars), "\n")
         yield winner_color
 
     def print_info_before_move(self, board, players_chars):
         print(
             f"Move #{self.move_idx // 2} / {players_chars[self.active_player.color]}. Current board is:"
         )
-        board.players_chars = players_chars
-        print(board, "\n")
+        print(board.to_str(players_chars), "\n")
 
     def print_info_after_move(
         self,
@@ -125,10 +127,13 @@ class TerminalGameplay(BaseGameplay):
         print(
             f'Scores are: {", ".join([players_chars[k] + "=" + str(v) for k, v in scores.items()])}\n'
             "Captures are:",
-            {players_chars[k]: v * 2 for k, v in board.captures.items()},
+            {char: board.get_captures(k) * 2 for k, char in players_chars.items()},
             "\n",
         )
 
+        if self.active_player.last_move_stats is not None:
+            print(f"Search: {format_stats(self.active_player.last_move_stats)}\n")
+
     @staticmethod
     def print_end_game_info(winner_color, players_chars):
         print(f'Game finished, player "{players_chars[winner_color]}" won!')
@@ -1,11 +1,25 @@
+import logging
 import os
+from datetime import datetime
+
+# game records of the terminal and window gameplays, logs/ of the project by default
+logs_dir = os.getenv(
+    "GAME_LOGS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+)
+
+# per-move board dumps of earlier versions, game records are kept
+stale_log_extensions = (".joblib",)
 
 
 def clear_previous_game_logs():
-    if not os.path.isdir("../logs"):
-        os.mkdir("../logs")
+    if not os.path.isdir(logs_dir):
+        os.makedirs(logs_dir)
+
+    for name in os.listdir(logs_dir):
+        if name.endswith(stale_log_extensions):
+            os.remove(os.path.join(logs_dir, name))
+            logging.debug(f"removed {os.path.join(logs_dir, name)}")
+
 
-    for name in os.listdir("../logs"):
-        if name.endswith(".joblib"):
-            os.remove(os.path.join("../logs", name))
-            print("removed", os.path.join("../logs", name))
+def get_game_record_path() -> str:
+    return os.path.join(logs_dir, f"game_{datetime.now():%Y%m%d_%H%M%S}.record")
@@ -3,7 +3,6 @@ from itertools import product
 from typing import Callable
 
 import numpy as np
-from cachetools import cached
 
 from board import Board
 
@@ -42,7 +41,6 @@ def hamming_similarity(l1: np.ndarray, l2: np.ndarray):
     return np.sum(l1 == l2)
 
 
-@cache
 def score_for_line_hamming(color: int, line: tuple) -> float:
     line = np.array(line, dtype=int)
     result = 0
@@ -61,7 +59,6 @@ def score_for_line_hamming(color: int, line: tuple) -> float:
     return result
 
 
-@cache
 def score_for_line_count_with_move(color: int, line: tuple, whos_move: int) -> float:
     line = np.array(line, dtype=int)
 
@@ -104,7 +101,6 @@ def score_for_line_count_with_move(color: int, line: tuple, whos_move: int) -> f
     return score * (1 if is_this_color_line else -1)
 
 
-@cache
 def score_for_line_count(color: int, line: tuple, whos_move: int) -> float:
     line = np.array(line, dtype=int)
 
@@ -126,7 +122,6 @@ def score_for_line_count(color: int, line: tuple, whos_move: int) -> float:
     return score * (1 if is_this_color_line else -1)
 
 
-@cached(cache={}, key=lambda color, line, whos_move: (line,))
 def whos_win(color: None, line: tuple, whos_move: None) -> int:
     line = np.array(line, dtype=int)
 
@@ -137,7 +132,6 @@ def whos_win(color: None, line: tuple, whos_move: None) -> int:
         return 0
 
 
-@cached(cache={}, key=lambda color, line, whos_move: (line, whos_move))
 def is_free_three(color: None, line: tuple, whos_move: int) -> float:
     """
     :param line: tuple длины 6
@@ -166,7 +160,12 @@ def is_free_three(color: None, line: tuple, whos_move: int) -> float:
         return 0
 
 
-def get_unique_lines_from_board(position: np.ndarray, line_len_to_analyze=5):
+@cache
+def get_board_windows(line_len_to_analyze=5) -> np.ndarray:
+    """
+    :return: flat position indices of every sliding window, shape (n_windows, line_len)
+    """
+    flat_indices = np.arange(Board.size * Board.size).reshape((Board.size, Board.size))
     (
         straight_line_indices_0,
         straight_line_indices_1,
@@ -174,37 +173,295 @@ def get_unique_lines_from_board(position: np.ndarray, line_len_to_analyze=5):
         diag_indices_1,
     ) = get_board_sliding_indices(line_len_to_analyze)
 
-    lines = np.concatenate(
+    return np.concatenate(
         [
-            position[straight_line_indices_0, straight_line_indices_1],
-            position[straight_line_indices_1, straight_line_indices_0],
-            position[diag_indices_0, diag_indices_1],
-            # position[diag_indices_1, diag_indices_0]
+            flat_indices[straight_line_indices_0, straight_line_indices_1],
+            flat_indices[straight_line_indices_1, straight_line_indices_0],
+            flat_indices[diag_indices_0, diag_indices_1],
         ]
     )
 
-    unique_lines, unique_counts = np.unique(lines, axis=0, return_counts=True)
-    return unique_lines, unique_counts
+
+@cache
+def get_point_windows(line_len_to_analyze=5) -> list[np.ndarray]:
+    """
+    :return: for every flat position index, ids of the windows passing through it
+    """
+    windows = get_board_windows(line_len_to_analyze)
+    window_ids = np.repeat(np.arange(len(windows)), line_len_to_analyze)
+    points = windows.ravel()
+
+    return [window_ids[points == p] for p in range(Board.size * Board.size)]
+
+
+@cache
+def get_point_window_digit_powers(
+    line_len_to_analyze=5,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: ids of the windows passing through every flat position index and
+        the base-3 power of the point's digit in each of these windows, both of
+        shape (n_points, max windows per point). Padding has window id 0 and
+        power 0, so it does not change the window code.
+    """
+    windows = get_board_windows(line_len_to_analyze)
+    point_windows = get_point_windows(line_len_to_analyze)
+    powers = get_window_powers(line_len_to_analyze)
+
+    max_n_windows = max(len(w) for w in point_windows)
+    window_ids = np.zeros((len(point_windows), max_n_windows), dtype=int)
+    digit_powers = np.zeros((len(point_windows), max_n_windows), dtype=int)
+
+    for point, ids in enumerate(point_windows):
+        window_ids[point, : len(ids)] = ids
+        digit_powers[point, : len(ids)] = powers[
+            np.argmax(windows[ids] == point, axis=1)
+        ]
+
+    return window_ids, digit_powers
+
+
+@cache
+def get_window_powers(line_len_to_analyze=5) -> np.ndarray:
+    return 3 ** np.arange(line_len_to_analyze)
+
+
+def encode_windows(position: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    """
+    Every window is encoded as base-3 number, digit of the cell is
+    0 for empty, 1 for color 1 and 2 for color -1.
+    """
+    return (position.ravel()[windows] % 3) @ get_window_powers(windows.shape[-1])
+
+
+def decode_window(code: int, line_len_to_analyze=5) -> tuple:
+    digits = code // get_window_powers(line_len_to_analyze) % 3
+    return tuple(np.where(digits == 2, -1, digits).tolist())
 
 
 @cache
+def build_score_table(
+    scorer_fn: Callable, scorer_args: tuple, whos_move: int | None, line_len: int
+) -> np.ndarray:
+    """
+    :return: table of shape (3 ** line_len, 3), row for every window code is
+        (finite score, 1 if score is +inf, 1 if score is -inf), so that sums over
+        windows can be subtracted back even if some of them are infinite
+    """
+    table = np.zeros((3**line_len, 3), dtype=np.float64)
+
+    for code in range(3**line_len):
+        score = scorer_fn(*scorer_args, decode_window(code, line_len), whos_move)
+        if score == np.inf:
+            table[code, 1] = 1
+        elif score == -np.inf:
+            table[code, 2] = 1
+        else:
+            table[code, 0] = score
+
+    return table
+
+
+def get_score_table(
+    h_fn: partial, whos_move: int | None, line_len_to_analyze=5
+) -> np.ndarray:
+    return build_score_table(h_fn.func, h_fn.args, whos_move, line_len_to_analyze)
+
+
+def get_heuristic_state_value(state: np.ndarray) -> float:
+    finite_sum, n_pos_inf, n_neg_inf = state
+    if n_pos_inf > 0 and n_neg_inf > 0:
+        return np.nan
+    if n_pos_inf > 0:
+        return np.inf
+    if n_neg_inf > 0:
+        return -np.inf
+    return finite_sum
+
+
+def get_heuristic_state_values(states: np.ndarray) -> np.ndarray:
+    """
+    Vectorized get_heuristic_state_value for states of shape (n, 3)
+    """
+    values = states[:, 0].copy()
+    values[states[:, 1] > 0] = np.inf
+    values[states[:, 2] > 0] = -np.inf
+    values[(states[:, 1] > 0) & (states[:, 2] > 0)] = np.nan
+    return values
+
+
+def get_full_heuristic_state(
+    h_fn: partial,
+    whos_move: int | None,
+    position: np.ndarray,
+    line_len_to_analyze=5,
+) -> np.ndarray:
+    codes = encode_windows(position, get_board_windows(line_len_to_analyze))
+    return get_score_table(h_fn, whos_move, line_len_to_analyze)[codes].sum(axis=0)
+
+
+def get_heuristic_state_delta(
+    h_fn: partial,
+    whos_move: int | None,
+    position: np.ndarray,
+    previous_position: np.ndarray,
+    changed_cells: list[tuple[int, int]],
+    line_len_to_analyze=5,
+) -> np.ndarray:
+    """
+    Difference of the heuristic between position and previous_position, computed
+    only on the windows passing through changed_cells (the move and the captures).
+    """
+    point_windows = get_point_windows(line_len_to_analyze)
+    if len(changed_cells) == 1:
+        x, y = changed_cells[0]
+        affected_window_ids = point_windows[x * Board.size + y]
+    else:
+        affected_window_ids = np.unique(
+            np.concatenate(
+                [point_windows[x * Board.size + y] for x, y in changed_cells]
+            )
+        )
+    affected_windows = get_board_windows(line_len_to_analyze)[affected_window_ids]
+
+    table = get_score_table(h_fn, whos_move, line_len_to_analyze)
+
+    return table[encode_windows(position, affected_windows)].sum(axis=0) - table[
+        encode_windows(previous_position, affected_windows)
+    ].sum(axis=0)
+
+
+def iterate_position_history(board: Board):
+    """
+    Yields (h_state, position, changed_cells) of board and of the positions it was
+    made from, newest first: the states saved by make_move, then the parents.
+    Positions before make_move are restored by reverting the changed cells.
+    """
+    h_state, position, changed_cells, move_color = (
+        board.h_state,
+        board.position,
+        board.changed_cells,
+        board.last_move_color,
+    )
+
+    for record in reversed(board.undo_stack or ()):
+        yield h_state, position, changed_cells
+
+        position = position.copy()
+        position[changed_cells[0]] = Board.empty_color
+        for cell in changed_cells[1:]:
+            position[cell] = -move_color
+
+        h_state, changed_cells, move_color = (
+            record.h_state,
+            record.changed_cells,
+            record.last_move_color,
+        )
+
+    yield h_state, position, changed_cells
+
+    board = board.parent
+    while board is not None:
+        yield board.h_state, board.position, board.changed_cells
+        board = board.parent
+
+
+def get_heuristic_state(
+    h_fn: partial,
+    whos_move: int | None,
+    board: Board,
+    line_len_to_analyze=5,
+) -> np.ndarray:
+    """
+    Heuristic sums are kept in board.h_state. If board does not have them yet,
+    they are derived from the nearest previous position that does, applying the
+    deltas of the moves made since. Only a board without such previous position
+    is scanned fully.
+    """
+    key = (h_fn, whos_move, line_len_to_analyze)
+
+    if key in board.h_state:
+        return board.h_state[key]
+
+    history = []
+    for h_state, position, changed_cells in iterate_position_history(board):
+        history.append((h_state, position, changed_cells))
+        if key in h_state:
+            break
+    else:
+        h_state, position, _ = history[-1]
+        h_state[key] = get_full_heuristic_state(
+            h_fn, whos_move, position, line_len_to_analyze
+        )
+
+    for (h_state, position, changed_cells), (
+        previous_h_state,
+        previous_position,
+        _,
+    ) in reversed(list(zip(history[:-1], history[1:]))):
+        h_state[key] = previous_h_state[key] + get_heuristic_state_delta(
+            h_fn,
+            whos_move,
+            position,
+            previous_position,
+            changed_cells,
+            line_len_to_analyze,
+        )
+
+    return board.h_state[key]
+
+
 def apply_scalar_heuristic(
-    h_fn: Callable[[tuple, int], float],
+    h_fn: partial,
     whos_move: int | None,
     board: Board,
     line_len_to_analyze=5,
 ):
-    unique_lines, unique_counts = get_unique_lines_from_board(
-        board.position, line_len_to_analyze=line_len_to_analyze
+    return get_heuristic_state_value(
+        get_heuristic_state(h_fn, whos_move, board, line_len_to_analyze)
     )
 
-    result = np.sum(
-        [
-            h_fn(tuple(x), whos_move) * count
-            for x, count in zip(unique_lines, unique_counts)
-        ]
-    )
-    return result
+
+def apply_scalar_heuristic_batch(
+    h_fn: partial,
+    whos_move: int | None,
+    board: Board,
+    moves: np.ndarray,
+    color: int,
+    line_len_to_analyze=5,
+) -> np.ndarray:
+    """
+    Heuristic values of the positions after each of the moves of color, without
+    creating boards for them. Each value is the board's value plus the delta of
+    the windows through the move, all moves are scored with one gather.
+    Only moves which capture are evaluated on a real board.
+
+    :param moves: array of shape (n, 2)
+    :return: array of shape (n,)
+    """
+    moves = np.asarray(moves, dtype=int).reshape((-1, 2))
+    table = get_score_table(h_fn, whos_move, line_len_to_analyze)
+    window_ids, digit_powers = get_point_window_digit_powers(line_len_to_analyze)
+
+    points = moves[:, 0] * Board.size + moves[:, 1]
+    old_codes = encode_windows(board.position, get_board_windows(line_len_to_analyze))[
+        window_ids[points]
+    ]
+    new_codes = old_codes + (color % 3) * digit_powers[points]
+
+    states = get_heuristic_state(h_fn, whos_move, board, line_len_to_analyze) + (
+        table[new_codes] - table[old_codes]
+    ).sum(axis=1)
+
+    for i in np.flatnonzero(board.get_capturing_moves_mask(moves, color)):
+        states[i] = get_heuristic_state(
+            h_fn,
+            whos_move,
+            board.get_board_after_move(moves[i, 0], moves[i, 1], color),
+            line_len_to_analyze,
+        )
+
+    return get_heuristic_state_values(states)
 
 
 class Heuristics:
@@ -225,3 +482,12 @@ def build_heuristic(
     return partial(
         apply_scalar_heuristic, scorer_fn, line_len_to_analyze=line_len_to_analyze
     )
+
+
+def get_batch_heuristic(h: partial) -> partial:
+    """
+    :param h: heuristic made by build_heuristic
+    :return: its apply_scalar_heuristic_batch version, called as
+        (whos_move, board, moves, color)
+    """
+    return partial(apply_scalar_heuristic_batch, *h.args, **h.keywords)
@@ -0,0 +1,139 @@
+from functools import cache
+
+import numpy as np
+
+from board import Board
+from heuristics.sliding import (
+    decode_window,
+    encode_windows,
+    get_board_windows,
+    is_free_three,
+)
+
+
+@cache
+def build_line_table(color: int, line_len: int, n_stones: int) -> np.ndarray:
+    """
+    :return: bool table of window codes, True for windows with n_stones of color
+        and all other cells empty
+    """
+    table = np.zeros((3**line_len,), dtype=bool)
+    for code in range(len(table)):
+        line = decode_window(code, line_len)
+        table[code] = line.count(color) == n_stones and line.count(
+            Board.empty_color
+        ) == (line_len - n_stones)
+    return table
+
+
+@cache
+def build_open_three_table(color: int) -> np.ndarray:
+    """
+    :return: bool table of codes of windows of 6 cells, True for free threes of color
+    """
+    table = np.zeros((3**6,), dtype=bool)
+    for code in range(len(table)):
+        table[code] = is_free_three(None, decode_window(code, 6), color) > 0
+    return table
+
+
+@cache
+def build_open_two_table(color: int) -> np.ndarray:
+    """
+    :return: bool table of codes of windows of 6 cells, True for windows with
+        empty ends and 2 stones of color and 2 empty cells inside, so that a
+        stone of color inside makes a free three
+    """
+    table = np.zeros((3**6,), dtype=bool)
+    for code in range(len(table)):
+        line = decode_window(code, 6)
+        table[code] = (
+            line[0] == Board.empty_color
+            and line[-1] == Board.empty_color
+            and line[1:-1].count(color) == 2
+            and line[1:-1].count(Board.empty_color) == 2
+        )
+    return table
+
+
+def has_five(position: np.ndarray, color: int) -> bool:
+    table = build_line_table(color, 5, 5)
+    return bool(np.any(table[encode_windows(position, get_board_windows(5))]))
+
+
+def get_empty_cells_of_windows(
+    position: np.ndarray, line_len: int, table: np.ndarray, inner_only: bool = False
+) -> np.ndarray:
+    """
+    :param inner_only: skip the first and the last cell of every window
+    :return: sorted flat indices of empty cells of windows whose code is True in table
+    """
+    windows = get_board_windows(line_len)
+    matched_windows = windows[table[encode_windows(position, windows)]]
+    if inner_only:
+        matched_windows = matched_windows[:, 1:-1]
+    cells = np.unique(matched_windows)
+    return cells[position.ravel()[cells] == Board.empty_color]
+
+
+def get_five_cells(position: np.ndarray, color: int) -> np.ndarray:
+    """
+    :return: flat indices of cells where color makes five
+    """
+    return get_empty_cells_of_windows(position, 5, build_line_table(color, 5, 4))
+
+
+def get_four_cells(position: np.ndarray, color: int) -> np.ndarray:
+    """
+    :return: flat indices of cells where color makes four, threatening five
+    """
+    return get_empty_cells_of_windows(position, 5, build_line_table(color, 5, 3))
+
+
+def get_open_three_cells(position: np.ndarray, color: int) -> np.ndarray:
+    """
+    :return: flat indices of empty cells of free threes of color, where the
+        opponent can block them
+    """
+    return get_empty_cells_of_windows(position, 6, build_open_three_table(color))
+
+
+def get_three_cells(position: np.ndarray, color: int) -> np.ndarray:
+    """
+    :return: flat indices of cells where color makes a free three
+    """
+    return get_empty_cells_of_windows(
+        position, 6, build_open_two_table(color), inner_only=True
+    )
+
+
+def get_forced_moves(
+    board: Board, color: int, candidate_moves: np.ndarray
+) -> np.ndarray | None:
+    """
+    Moves color has to choose from because of threats on the board:
+    own five if there is one, otherwise blocks and captures against opponent's
+    four, otherwise blocks, own fours and captures against opponent's free three.
+
+    :param candidate_moves: moves of shape (n, 2) to look for captures in
+    :return: moves of shape (n, 2), None if color is not forced
+    """
+    position = board.position
+
+    cells = get_five_cells(position, color)
+    if len(cells) == 0:
+        cells = get_five_cells(position, -color)
+        if len(cells) == 0:
+            cells = get_open_three_cells(position, -color)
+            if len(cells) == 0:
+                return None
+            cells = np.union1d(cells, get_four_cells(position, color))
+
+        capturing_moves = candidate_moves[
+            board.get_capturing_moves_mask(candidate_moves, color)
+        ]
+        cells = np.union1d(
+            cells, capturing_moves[:, 0] * Board.size + capturing_moves[:, 1]
+        )
+
+    return np.stack(np.divmod(cells, Board.size), axis=1)
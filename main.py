@@ -19,13 +19,36 @@ def init_logging():
 
 
 def create_players(
-    p_types: list[Literal["human", "AI", "bm"]]
+    p_types: list[Literal["human", "AI", "bm"]],
+    move_time: float | None = None,
+    ponder: bool = False,
 ) -> tuple[Player, Player]:
     player_colors = [1, -1]
 
     p_types_dict = {"human": HumanPlayer, "AI": AIPlayer, "bm": BenchmarkPlayer}
+    p_kwargs_dict = {"AI": {"move_time": move_time, "ponder": ponder}}
+
+    return tuple(
+        [
+            p_types_dict[p_type](player_colors.pop(), **p_kwargs_dict.get(p_type, {}))
+            for p_type in p_types
+        ]
+    )
 
-    return tuple([p_types_dict[p_type](player_colors.pop()) for p_type in p_types])
+
+def parse_duration(value: str) -> float:
+    """
+    Parses "0.5s", "500ms" or "0.5" into seconds.
+    """
+    value = value.strip()
+    try:
+        if value.endswith("ms"):
+            return float(value[:-2]) / 1000
+        if value.endswith("s"):
+            return float(value[:-1])
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -40,6 +63,18 @@ def parse_args() -> argparse.Namespace:
         dest="g",
         default="visual",
     )
+    parser.add_argument(
+        "--move-time",
+        type=parse_duration,
+        dest="move_time",
+        default=None,
+        help="time budget per AI move, e.g. 0.5s or 500ms. Fixed DEPTH if not set",
+    )
+    parser.add_argument(
+        "--ponder",
+        action="store_true",
+        help="AI keeps searching while a human player is thinking",
+    )
     return parser.parse_args()
 
 
@@ -65,7 +100,12 @@ def main():
 
     gameplay_classes_dict = {"visual": VisualGameplay, "terminal": TerminalGameplay}
 
-    start_game(*create_players([args.p1, args.p2]), gameplay_classes_dict[args.g])
+    start_game(
+        *create_players(
+            [args.p1, args.p2], move_time=args.move_time, ponder=args.ponder
+        ),
+        gameplay_classes_dict[args.g],
+    )
 
 
 if __name__ == "__main__":
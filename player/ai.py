@@ -1,87 +1,317 @@
+import ctypes
+import logging
+import math
 import os
-from functools import cache, partial
-from multiprocessing import Manager
-from multiprocessing.managers import ValueProxy
-from multiprocessing.pool import AsyncResult
+import threading
+import time
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.sharedctypes import RawValue
 
 import numpy as np
-from cachetools import cached
 
-from board import Board
-from heuristics.sliding import Heuristics, build_heuristic
+from board import Board, candidate_radius
+from heuristics.sliding import Heuristics, build_heuristic, get_batch_heuristic
+from heuristics.threats import get_forced_moves
 from player.base import Player
+from player.book import default_book_path, load_opening_book
+from player.ordering import MoveOrdering
+from player.stats import SearchStats, add_log_file, log_stats
+from player.store import load_result_store, solved_depth
+from player.threat_space import ThreatSpaceSearch
+from player.transposition import EntryFlag, TranspositionTable
+from symmetry import get_canonical_hash
 
 free_three_counter = build_heuristic(None, Heuristics.free_three, line_len_to_analyze=6)
+batch_free_three_counter = get_batch_heuristic(free_three_counter)
 
+transposition_table_size_mb = float(os.getenv("TT_SIZE_MB", "64"))
+transposition_table = TranspositionTable(transposition_table_size_mb)
 
-def yield_completed(positions: list, async_results: list[AsyncResult]):
-    async_results_dict = {i: v for i, v in enumerate(async_results)}
-    while len(async_results_dict) > 0:
-        to_pop = None
-        for i, as_res in async_results_dict.items():
-            if as_res.ready():
-                to_pop = i
-                yield as_res.get(), positions[i]
-        if to_pop is not None:
-            async_results_dict.pop(to_pop)
+move_ordering = MoveOrdering()
 
+# key positions with up to symmetric_tt_max_stones stones by the canonical hash
+# of their 8 symmetries, so that symmetric openings share table entries
+symmetric_tt = os.getenv("SYMMETRIC_TT", "0") == "1"
+symmetric_tt_max_stones = int(os.getenv("SYMMETRIC_TT_MAX_STONES", "8"))
 
-@cache
-def get_next_positions(board: Board, color: int, h=None) -> list[Board]:
-    possible_moves_set = set()
+# generate only forcing and defending moves when there are fours or free threes
+threat_pruning = os.getenv("THREAT_PRUNING", "1") == "1"
+
+# stops the search when true, set by SearchEngine.stop, replaced by the shared
+# flag of LazySMPSearch in its helper processes
+stop_flag: ctypes.c_bool = ctypes.c_bool(False)
+
+# best root move of the running search so far, for a search stopped early
+root_best_move: tuple[int, int] | None = None
+
+# number of minimax and negamax calls of this process
+nodes_searched = 0
+
+# counters of the current move's search, None unless SearchEngine.collect_stats
+search_stats: SearchStats | None = None
+
+search_algorithms = ("minimax", "pvs")
+
+maximizer_keys = {1: 0, -1: 0x9E3779B97F4A7C15}
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def get_transposition_key(position: Board, maximizer_color: int) -> tuple[int, int]:
+    """
+    :return: key of position and the symmetry which maps position to the one
+        of the key, to be passed to probe and store of the transposition table
+    """
+    if symmetric_tt and np.count_nonzero(position.position) <= symmetric_tt_max_stones:
+        key, symmetry = get_canonical_hash(position)
+        return key ^ maximizer_keys[maximizer_color], symmetry
+    return hash(position) ^ maximizer_keys[maximizer_color], 0
+
+
+def get_store_key(position: Board, color: int) -> tuple[int, int]:
+    """
+    :return: key of position searched for color in the result store and the
+        symmetry which maps position to the one of the key
+    """
+    key, symmetry = get_canonical_hash(position)
+    return key ^ maximizer_keys[color], symmetry
+
+
+def share_transposition_table() -> TranspositionTable:
+    """
+    Moves the transposition table to shared memory, so that it can be passed to
+    helper processes. All players of the process keep using the same table.
+    """
+    global transposition_table
+
+    if not transposition_table.shared:
+        transposition_table = TranspositionTable(
+            transposition_table_size_mb, shared=True
+        )
+    return transposition_table
+
+
+def get_next_moves(
+    board: Board, color: int, h_batch=None
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    :param h_batch: heuristic made by get_batch_heuristic, with whos_move bound
+    :return: legal moves of color of shape (n, 2) and, if h_batch is given,
+        heuristic values of the positions after them. If threat_pruning is on and
+        color has to answer a threat, only the answers are returned.
+    """
+    moves = board.get_candidate_moves()
+
+    if threat_pruning:
+        forced_moves = get_forced_moves(board, color, moves)
+        if forced_moves is not None:
+            moves = get_legal_moves(board, color, forced_moves)
+            if len(moves) > 0:
+                return moves, None if h_batch is None else h_batch(board, moves, color)
+            moves = board.get_candidate_moves()
+
+    moves = get_legal_moves(board, color, moves)
+
+    if h_batch is None:
+        return moves, None
+    return moves, h_batch(board, moves, color)
 
-    for stone_coords in np.argwhere(board.position != board.empty_color):
-        for neighbour_coords in board.get_point_neighbours_coords_to_all_directions(
-            *stone_coords, at_distance=1
-        ):
-            if board.is_point_empty(*neighbour_coords):
-                possible_moves_set.add(tuple(neighbour_coords))
-
-    possible_moves_set.update(
-        [
-            tuple(p)
-            for p in board.get_center_square_points()
-            if board.is_point_empty(p[0], p[1])
-        ]
-    )
-    if h is None:
-        result = [
-            board.get_board_after_move(m[0], m[1], color) for m in possible_moves_set
-        ]
-    else:
-        result = [
-            board.get_board_after_move(m[0], m[1], color).compute_h_for_self(h)
-            for m in possible_moves_set
-        ]
 
-    return [
-        x
-        for x in result
-        if not x.update_double_free_three_count_and_check_if_violated(
+def generate_moves(board: Board, color: int) -> np.ndarray:
+    if search_stats is None:
+        return get_next_moves(board, color)[0]
+    time_start = time.perf_counter()
+    moves = get_next_moves(board, color)[0]
+    search_stats.add_time("move_generation", time.perf_counter() - time_start)
+    return moves
+
+
+def evaluate_moves(h_batch, board: Board, moves: np.ndarray, color: int) -> np.ndarray:
+    """
+    :return: heuristic values of the positions after moves of color
+    """
+    if search_stats is None:
+        return h_batch(board, moves, color)
+    time_start = time.perf_counter()
+    h_values = h_batch(board, moves, color)
+    search_stats.add_time("evaluation", time.perf_counter() - time_start)
+    search_stats.evaluations += len(moves)
+    return h_values
+
+
+def evaluate_position(h_func, whos_move: int, position: Board) -> float:
+    if search_stats is None:
+        return h_func(whos_move, position)
+    time_start = time.perf_counter()
+    h_value = h_func(whos_move, position)
+    search_stats.add_time("evaluation", time.perf_counter() - time_start)
+    search_stats.evaluations += 1
+    return h_value
+
+
+def get_legal_moves(board: Board, color: int, moves: np.ndarray) -> np.ndarray:
+    """
+    :return: moves which do not make two free threes at once
+    """
+    if board.move_idx + 1 >= 8:
+        new_free_threes_count = batch_free_three_counter(color, board, moves, color)
+        moves = moves[new_free_threes_count - board.get_free_threes_count(color) <= 1]
+    return moves
+
+
+def get_next_positions(
+    board: Board, color: int, moves: np.ndarray, h_values: np.ndarray = None
+):
+    """
+    Lazily creates boards after moves returned by get_next_moves
+    """
+    for i, (x, y) in enumerate(moves):
+        if search_stats is not None:
+            time_start = time.perf_counter()
+        next_position = board.get_board_after_move(x, y, color)
+        next_position.update_double_free_three_count_and_check_if_violated(
             free_three_counter
         )
-    ]
+        if search_stats is not None:
+            search_stats.add_time("board_update", time.perf_counter() - time_start)
+        if h_values is not None:
+            next_position.h_val = h_values[i]
+        yield next_position
+
+
+def get_next_positions_inplace(
+    board: Board, color: int, moves: np.ndarray, h_values: np.ndarray = None
+):
+    """
+    Same as get_next_positions, but yields board itself after make_move.
+    The move is undone when the next one is requested or the generator is closed.
+    """
+    for i, (x, y) in enumerate(moves):
+        if search_stats is not None:
+            time_start = time.perf_counter()
+        board.make_move(x, y, color)
+        try:
+            board.update_double_free_three_count_and_check_if_violated(
+                free_three_counter
+            )
+            if search_stats is not None:
+                search_stats.add_time("board_update", time.perf_counter() - time_start)
+            if h_values is not None:
+                board.h_val = h_values[i]
+            yield board
+        finally:
+            if search_stats is not None:
+                time_start = time.perf_counter()
+            board.undo_move()
+            if search_stats is not None:
+                search_stats.add_time("board_update", time.perf_counter() - time_start)
+
+
+def get_side_score(score: float, flag: int, sign: int) -> tuple[float, int]:
+    """
+    Converts score and its bound flag between the maximizer's point of view and
+    the point of view of the side to move, sign is -1 if they differ
+    """
+    if sign == 1:
+        return score, flag
+    if flag == EntryFlag.lower_bound:
+        flag = EntryFlag.upper_bound
+    elif flag == EntryFlag.upper_bound:
+        flag = EntryFlag.lower_bound
+    return -score, flag
+
+
+def add_cutoff(ply: int, color: int, position_after_move: Board, depth: int):
+    """
+    Captures are ordered before killers anyway, so only quiet moves are kept
+    """
+    if search_stats is not None:
+        search_stats.cutoffs += 1
+    if len(position_after_move.changed_cells) == 1:
+        move_ordering.add_cutoff(ply, color, position_after_move.from_move, depth)
+
+
+def get_move_order(
+    position: Board,
+    moves: np.ndarray,
+    side_values: np.ndarray,
+    color: int,
+    ply: int,
+    tt_move: tuple[int, int] | None,
+    root_shift: int,
+) -> np.ndarray:
+    """
+    :param side_values: heuristic values of the positions after moves, from the
+        point of view of color
+    :return: indices of moves in search order, only the first winning one if
+        there is one
+    """
+    if search_stats is not None:
+        time_start = time.perf_counter()
+
+    winning_moves_idx = np.flatnonzero(side_values == np.inf)
+    if len(winning_moves_idx) > 0:
+        order = winning_moves_idx[:1]
+    else:
+        is_tt_move = np.zeros((len(moves),), dtype=bool)
+        if tt_move is not None:
+            is_tt_move = np.all(moves == tt_move, axis=1)
+        # the last key is the first to order by
+        order = np.lexsort(
+            (
+                -move_ordering.get_history(color, moves),
+                -side_values,
+                ~position.get_capture_threat_moves_mask(moves, color),
+                ~move_ordering.get_killers_mask(ply, moves),
+                ~position.get_capturing_moves_mask(moves, color),
+                ~is_tt_move,
+            )
+        )
+        if root_shift:
+            order = np.roll(order, -(root_shift % len(order)))
+
+    if search_stats is not None:
+        search_stats.add_time("move_ordering", time.perf_counter() - time_start)
+    return order
 
 
-@cached(
-    cache={},
-    key=lambda is_maximizer, depth, alpha, beta, maximizer_color, minimizer_color, h_func, position, pool=None: (
-        position,
-        depth,
-        is_maximizer,
-    ),
-)
 def minimax(
     is_maximizer: bool,
     depth: int,
-    alpha: float | ValueProxy,
-    beta: float | ValueProxy,
+    alpha: float,
+    beta: float,
     maximizer_color: int,
     minimizer_color: int,
     h_func,
     position: Board,
-    pool=None,
+    deadline: float | None = None,
+    inplace: bool = False,
+    root_shift: int = 0,
+    ply: int = 0,
+    root_moves: np.ndarray | None = None,
 ) -> tuple[float, tuple[int, int] | None]:
+    """
+    :param inplace: walk the tree with make_move/undo_move on position itself
+        instead of creating a board for every node. Position is restored on
+        return.
+    :param root_shift: search moves of this node starting from the one at this
+        index of the usual order, so that helpers of LazySMPSearch do not all
+        walk the tree in the same order
+    :param ply: distance from the root, for killer moves
+    :param root_moves: search only these moves of this node, which is then
+        neither cut off by nor stored to the transposition table
+    """
+    global nodes_searched, root_best_move
+
+    if (deadline is not None and time.monotonic() > deadline) or stop_flag.value:
+        raise SearchTimeout()
+    nodes_searched += 1
+    if search_stats is not None:
+        search_stats.add_node(ply)
+
     if position.h_val is not None and position.h_val in (np.inf, -np.inf):
         return position.h_val, position.from_move
 
@@ -95,114 +325,931 @@ def minimax(
         next_move_color = maximizer_color
 
     if depth == 0:
-        return h_func(next_move_color, position), None
+        return evaluate_position(h_func, next_move_color, position), None
+
+    alpha_orig, beta_orig = alpha, beta
+
+    tt_key, tt_symmetry = get_transposition_key(position, maximizer_color)
+    tt_move = None
+    tt_entry = transposition_table.probe(tt_key, tt_symmetry)
+    if search_stats is not None:
+        search_stats.add_tt_probe(tt_entry is not None)
+    if tt_entry is not None:
+        tt_score, tt_depth, tt_flag, tt_move = tt_entry
+        if (
+            root_moves is None
+            and tt_depth >= depth
+            and (
+                tt_flag == EntryFlag.exact
+                or (tt_flag == EntryFlag.lower_bound and tt_score >= beta_orig)
+                or (tt_flag == EntryFlag.upper_bound and tt_score <= alpha_orig)
+            )
+        ):
+            if search_stats is not None:
+                search_stats.tt_cutoffs += 1
+            return tt_score, tt_move
 
-    next_positions = sorted(
-        get_next_positions(position, move_color, h=partial(h_func, next_move_color)),
-        key=lambda p: p.h_val,
-        reverse=is_maximizer,
+    moves = (
+        root_moves if root_moves is not None else generate_moves(position, move_color)
+    )
+    if search_stats is not None:
+        search_stats.add_expanded_node(ply, len(moves))
+    h_values = evaluate_moves(
+        partial(get_batch_heuristic(h_func), next_move_color),
+        position,
+        moves,
+        move_color,
     )
 
-    if next_positions[0].h_val == win_value:
-        next_positions = [next_positions[0]]
+    order = get_move_order(
+        position,
+        moves,
+        h_values if is_maximizer else -h_values,
+        move_color,
+        ply,
+        tt_move,
+        root_shift,
+    )
+
+    if inplace:
+        next_positions = get_next_positions_inplace(
+            position, move_color, moves[order], h_values[order]
+        )
+    else:
+        next_positions = get_next_positions(
+            position, move_color, moves[order], h_values[order]
+        )
 
     this_layer_best_score = -win_value
     this_layer_best_next_move = None
 
-    if pool is None and isinstance(alpha, ValueProxy):
-        alpha = alpha.value
-        beta = beta.value
-
     next_minimax_partial = partial(
         minimax,
         not is_maximizer,
         depth - 1,
-        alpha,
-        beta,
-        maximizer_color,
-        minimizer_color,
-        h_func,
+        maximizer_color=maximizer_color,
+        minimizer_color=minimizer_color,
+        h_func=h_func,
+        deadline=deadline,
+        inplace=inplace,
+        ply=ply + 1,
     )
 
-    if is_maximizer:
-        if pool is not None:
-            results = [
-                pool.apply_async(
-                    next_minimax_partial,
-                    args=(next_position,),
+    try:
+        if is_maximizer:
+            for next_position in next_positions:
+                score, _ = next_minimax_partial(
+                    alpha=alpha, beta=beta, position=next_position
                 )
-                for next_position in next_positions
-            ]
 
-            for (score, _), next_position in yield_completed(next_positions, results):
                 if score > this_layer_best_score or this_layer_best_next_move is None:
                     this_layer_best_score = score
                     this_layer_best_next_move = next_position.from_move
+                    if ply == 0:
+                        root_best_move = this_layer_best_next_move
 
-                if this_layer_best_score > alpha.value:
-                    alpha.value = this_layer_best_score
+                if this_layer_best_score > alpha:
+                    alpha = this_layer_best_score
 
-                if beta.value <= alpha.value:
+                if beta <= alpha:
+                    add_cutoff(ply, move_color, next_position, depth)
                     break
-
         else:
             for next_position in next_positions:
-                score, _ = next_minimax_partial(next_position)
+                score, _ = next_minimax_partial(
+                    alpha=alpha, beta=beta, position=next_position
+                )
 
-                if score > this_layer_best_score or this_layer_best_next_move is None:
+                if score < this_layer_best_score or this_layer_best_next_move is None:
                     this_layer_best_score = score
                     this_layer_best_next_move = next_position.from_move
 
-                if this_layer_best_score > alpha:
-                    alpha = this_layer_best_score
+                if this_layer_best_score < beta:
+                    beta = this_layer_best_score
 
                 if beta <= alpha:
+                    add_cutoff(ply, move_color, next_position, depth)
                     break
+    finally:
+        next_positions.close()
+
+    if this_layer_best_score <= alpha_orig:
+        tt_flag = EntryFlag.upper_bound
+    elif this_layer_best_score >= beta_orig:
+        tt_flag = EntryFlag.lower_bound
     else:
-        for next_position in next_positions:
-            score, _ = next_minimax_partial(next_position)
+        tt_flag = EntryFlag.exact
+    if root_moves is None:
+        transposition_table.store(
+            tt_key,
+            this_layer_best_score,
+            depth,
+            tt_flag,
+            this_layer_best_next_move,
+            tt_symmetry,
+        )
+
+    return this_layer_best_score, this_layer_best_next_move
+
+
+def negamax(
+    depth: int,
+    alpha: float,
+    beta: float,
+    color: int,
+    maximizer_color: int,
+    h_func,
+    position: Board,
+    deadline: float | None = None,
+    inplace: bool = False,
+    root_shift: int = 0,
+    ply: int = 0,
+    root_moves: np.ndarray | None = None,
+) -> tuple[float, tuple[int, int] | None]:
+    """
+    Principal variation search in negamax form, scores are from the point of
+    view of color, the side to move. The first child is searched with the full
+    window, the others with a null window above alpha, and are searched again
+    with the full window only if they turn out to be better than the first one.
+    h_func and the transposition table keep scores of maximizer_color.
+    Parameters are the same as of minimax.
+    """
+    global nodes_searched, root_best_move
+
+    if (deadline is not None and time.monotonic() > deadline) or stop_flag.value:
+        raise SearchTimeout()
+    nodes_searched += 1
+    if search_stats is not None:
+        search_stats.add_node(ply)
+
+    sign = 1 if color == maximizer_color else -1
+
+    if position.h_val is not None and position.h_val in (np.inf, -np.inf):
+        return sign * position.h_val, position.from_move
+
+    if depth == 0:
+        return sign * evaluate_position(h_func, color, position), None
+
+    alpha_orig = alpha
+
+    tt_key, tt_symmetry = get_transposition_key(position, maximizer_color)
+    tt_move = None
+    tt_entry = transposition_table.probe(tt_key, tt_symmetry)
+    if search_stats is not None:
+        search_stats.add_tt_probe(tt_entry is not None)
+    if tt_entry is not None:
+        tt_score, tt_depth, tt_flag, tt_move = tt_entry
+        tt_score, tt_flag = get_side_score(tt_score, tt_flag, sign)
+        if (
+            root_moves is None
+            and tt_depth >= depth
+            and (
+                tt_flag == EntryFlag.exact
+                or (tt_flag == EntryFlag.lower_bound and tt_score >= beta)
+                or (tt_flag == EntryFlag.upper_bound and tt_score <= alpha)
+            )
+        ):
+            if search_stats is not None:
+                search_stats.tt_cutoffs += 1
+            return tt_score, tt_move
+
+    moves = root_moves if root_moves is not None else generate_moves(position, color)
+    if search_stats is not None:
+        search_stats.add_expanded_node(ply, len(moves))
+    h_values = evaluate_moves(
+        partial(get_batch_heuristic(h_func), -color), position, moves, color
+    )
+
+    order = get_move_order(
+        position, moves, sign * h_values, color, ply, tt_move, root_shift
+    )
+
+    if inplace:
+        next_positions = get_next_positions_inplace(
+            position, color, moves[order], h_values[order]
+        )
+    else:
+        next_positions = get_next_positions(
+            position, color, moves[order], h_values[order]
+        )
+
+    best_score = -np.inf
+    best_next_move = None
+
+    next_negamax_partial = partial(
+        negamax,
+        depth - 1,
+        color=-color,
+        maximizer_color=maximizer_color,
+        h_func=h_func,
+        deadline=deadline,
+        inplace=inplace,
+        ply=ply + 1,
+    )
+
+    try:
+        for i, next_position in enumerate(next_positions):
+            # there is no null window above -inf
+            if i == 0 or alpha == -np.inf:
+                score = -next_negamax_partial(
+                    alpha=-beta, beta=-alpha, position=next_position
+                )[0]
+            else:
+                score = -next_negamax_partial(
+                    alpha=-np.nextafter(alpha, np.inf),
+                    beta=-alpha,
+                    position=next_position,
+                )[0]
+                if alpha < score < beta:
+                    score = -next_negamax_partial(
+                        alpha=-beta, beta=-alpha, position=next_position
+                    )[0]
 
-            if score < this_layer_best_score or this_layer_best_next_move is None:
-                this_layer_best_score = score
-                this_layer_best_next_move = next_position.from_move
+            if score > best_score or best_next_move is None:
+                best_score = score
+                best_next_move = next_position.from_move
+                if ply == 0:
+                    root_best_move = best_next_move
 
-            if this_layer_best_score < beta:
-                beta = this_layer_best_score
+            if best_score > alpha:
+                alpha = best_score
 
             if beta <= alpha:
+                add_cutoff(ply, color, next_position, depth)
                 break
+    finally:
+        next_positions.close()
 
-    return this_layer_best_score, this_layer_best_next_move
+    if best_score <= alpha_orig:
+        tt_flag = EntryFlag.upper_bound
+    elif best_score >= beta:
+        tt_flag = EntryFlag.lower_bound
+    else:
+        tt_flag = EntryFlag.exact
+    if root_moves is None:
+        transposition_table.store(
+            tt_key,
+            *get_side_score(best_score, tt_flag, sign),
+            depth,
+            best_next_move,
+            tt_symmetry,
+        )
 
+    return best_score, best_next_move
+
+
+def search_root(
+    algorithm: str,
+    depth: int,
+    alpha: float,
+    beta: float,
+    color: int,
+    h_func,
+    position: Board,
+    **search_kwargs,
+) -> tuple[float, tuple[int, int] | None]:
+    """
+    :param algorithm: one of search_algorithms
+    :return: best score for color, to move on position, and the move
+    """
+    if algorithm == "pvs":
+        return negamax(
+            depth, alpha, beta, color, color, h_func, position, **search_kwargs
+        )
+    return minimax(
+        True, depth, alpha, beta, color, -color, h_func, position, **search_kwargs
+    )
+
+
+def init_search_helper(table: TranspositionTable, flag: ctypes.c_bool):
+    global transposition_table, stop_flag
+
+    transposition_table = table
+    stop_flag = flag
+
+
+def run_search_helper(
+    algorithm: str,
+    depth: int,
+    color: int,
+    h_func,
+    position: Board,
+    tt_age: int,
+    search_kwargs: dict,
+):
+    """
+    Search of a helper process, its only result is what it stores in the
+    shared transposition table
+    """
+    transposition_table.age = tt_age
+    try:
+        search_root(
+            algorithm, depth, -np.inf, np.inf, color, h_func, position, **search_kwargs
+        )
+    except SearchTimeout:
+        pass
+
+
+class LazySMPSearch:
+    """
+    Lazy SMP: helper processes search the same position as the main one, half of
+    them one ply deeper and each starting from a different root move. They share
+    only the transposition table, which lets the main search cut off and order
+    moves by their results. Helpers are stopped once the main search returns.
+    """
+
+    def __init__(self, n_helpers: int):
+        self.n_helpers = n_helpers
+        self.stop_flag = RawValue(ctypes.c_bool, False)
+        self.pool = Pool(
+            processes=n_helpers,
+            initializer=init_search_helper,
+            initargs=(share_transposition_table(), self.stop_flag),
+        )
+
+    def search(
+        self,
+        algorithm: str,
+        depth: int,
+        alpha: float,
+        beta: float,
+        color: int,
+        h_func,
+        position: Board,
+        **search_kwargs,
+    ) -> tuple[float, tuple[int, int] | None]:
+        """
+        Same as search_root, helpers always search with the full window
+        """
+        helper_results = [
+            self.pool.apply_async(
+                run_search_helper,
+                args=(
+                    algorithm,
+                    depth + i % 2,
+                    color,
+                    h_func,
+                    position,
+                    transposition_table.age,
+                    search_kwargs | {"root_shift": i + 1},
+                ),
+            )
+            for i in range(self.n_helpers)
+        ]
+
+        try:
+            return search_root(
+                algorithm, depth, alpha, beta, color, h_func, position, **search_kwargs
+            )
+        finally:
+            self.stop_flag.value = True
+            for result in helper_results:
+                result.wait()
+            self.stop_flag.value = False
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
 
-class AIPlayer(Player):
-    def __init__(self, color):
-        super().__init__(color)
 
+class SearchEngine:
+    """
+    Searches moves for the AI players and hints of a gameplay session. Helper
+    processes are started once and the transposition table is kept between
+    moves and games, so every search starts with warm caches.
+    """
+
+    def __init__(self):
         self.calculation_depth = int(os.getenv("DEPTH", "3"))
+        self.max_depth = int(os.getenv("MAX_DEPTH", "32"))
+        self.inplace_search = os.getenv("SEARCH_MODE", "inplace") == "inplace"
+        # one of search_algorithms
+        self.algorithm = os.getenv("SEARCH_ALGORITHM", "minimax")
+        # half width of the window around the previous iteration's score with pvs
+        self.aspiration_window = float(os.getenv("ASPIRATION_WINDOW", "200"))
 
-        self.h = build_heuristic(self.color, Heuristics.count)
+        # 1 searches in this process only, more adds Lazy SMP helper processes
+        self.max_workers = int(os.getenv("SEARCH_WORKERS", os.cpu_count()))
+        self.parallel_search = None
+        self.is_started = False
 
-        self.max_workers = os.cpu_count()
+        # forced wins and defenses are looked for before the main search
+        self.threat_search = os.getenv("THREAT_SEARCH", "1") == "1"
+        self.threat_space_search = ThreatSpaceSearch()
 
-    def get_move(self, position: Board) -> tuple[int, int]:
-        _, best_next_move = minimax(
-            True,
-            self.calculation_depth,
-            self.manager.Value("i", -np.inf),
-            self.manager.Value("i", np.inf),
-            self.color,
-            self.opponent_color,
-            self.h,
+        # moves of opening positions are taken from the book, empty path for none
+        self.opening_book = load_opening_book(
+            os.getenv("OPENING_BOOK", default_book_path)
+        )
+        # results of searches to at least result_store_min_depth and solved
+        # positions are kept in this file between runs, empty path for none
+        self.result_store = load_result_store(os.getenv("RESULT_STORE", ""))
+        self.result_store_min_depth = int(os.getenv("RESULT_STORE_MIN_DEPTH", "4"))
+        # score, depth and move of the last search completed in a full window
+        self.last_result = None
+
+        # counters of every move's search, logged as json to stats_log_path if set
+        self.collect_stats = os.getenv("SEARCH_STATS", "0") == "1"
+        self.stats_log_path = os.getenv("SEARCH_STATS_LOG")
+        self.last_stats = None
+
+        # depth of the running search and nodes_searched when its move started
+        self.search_depth = 0
+        self.move_nodes_start = nodes_searched
+
+        # stop only sets stop_flag while a search runs, so that it does not stop
+        # the next one if the running search has just finished
+        self.search_lock = threading.Lock()
+        self.is_searching = False
+
+        # hash of the position pondered on, see ponder
+        self.ponder_hash = None
+
+        # line score of the evaluation, heuristics are built from it per color
+        self.heuristic = Heuristics.count
+        self.heuristics = {}
+
+    def start(self):
+        if self.is_started:
+            return
+        if self.max_workers > 1:
+            self.parallel_search = LazySMPSearch(self.max_workers - 1)
+        transposition_table.clear()
+        move_ordering.clear()
+        self.threat_space_search.clear()
+        if self.collect_stats and self.stats_log_path is not None:
+            add_log_file(self.stats_log_path)
+        self.is_started = True
+
+    def close(self):
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+        self.is_started = False
+
+    def stop(self):
+        """
+        Stops the running search, can be called from another thread. get_move
+        then returns the best move found so far.
+        """
+        with self.search_lock:
+            if self.is_searching:
+                stop_flag.value = True
+
+    def start_searching(self):
+        with self.search_lock:
+            self.is_searching = True
+
+    def end_searching(self):
+        with self.search_lock:
+            self.is_searching = False
+            stop_flag.value = False
+
+    def get_progress(self) -> tuple[int, int]:
+        """
+        :return: depth of the running search and number of nodes searched by this
+            process for the current move
+        """
+        return self.search_depth, nodes_searched - self.move_nodes_start
+
+    def get_heuristic(self, color: int):
+        if color not in self.heuristics:
+            self.heuristics[color] = build_heuristic(color, self.heuristic)
+        return self.heuristics[color]
+
+    def search(
+        self,
+        position: Board,
+        color: int,
+        depth: int,
+        deadline: float | None = None,
+        root_moves: np.ndarray | None = None,
+        alpha: float = -np.inf,
+        beta: float = np.inf,
+    ) -> tuple[float, tuple[int, int] | None]:
+        time_start = time.monotonic()
+        nodes_before = nodes_searched
+        self.search_depth = depth
+        if self.inplace_search:
+            position = position.copy()
+
+        result = (
+            self.parallel_search.search
+            if self.parallel_search is not None
+            else search_root
+        )(
+            self.algorithm,
+            depth,
+            alpha,
+            beta,
+            color,
+            self.get_heuristic(color),
             position,
-            pool=self.pool,
+            deadline=deadline,
+            inplace=self.inplace_search,
+            root_moves=root_moves,
+        )
+        if search_stats is not None:
+            search_stats.depth = depth
+        score, move = result
+        # scores out of a narrowed window are bounds only
+        if (alpha == -np.inf and beta == np.inf) or alpha < score < beta:
+            self.last_result = score, depth, move
+
+        logging.debug(
+            f"depth {depth} searched with {self.algorithm} by {self.max_workers} "
+            f"workers in {time.monotonic() - time_start:.3f}s, "
+            f"{nodes_searched - nodes_before} nodes in this process"
+        )
+        return result
+
+    def get_store_config(self, move_time: float | None) -> str:
+        """
+        :return: settings which change the move searched with move_time, results
+            are stored and looked up for them only
+        """
+        limit = (
+            f"depth={self.calculation_depth}"
+            if move_time is None
+            else f"move_time={move_time:g},max_depth={self.max_depth}"
+        )
+        return (
+            f"algorithm={self.algorithm},heuristic={self.heuristic.__name__},"
+            f"threat_search={int(self.threat_search)},"
+            f"threat_pruning={int(threat_pruning)},symmetric_tt={int(symmetric_tt)},"
+            f"candidate_radius={candidate_radius},"
+            f"aspiration_window={self.aspiration_window:g},{limit}"
         )
 
+    def store_result(
+        self,
+        position: Board,
+        color: int,
+        config: str,
+        score: float,
+        depth: int,
+        move: tuple[int, int] | None,
+    ):
+        if (
+            self.result_store is None
+            or move is None
+            or (depth < self.result_store_min_depth and score not in (np.inf, -np.inf))
+        ):
+            return
+        key, symmetry = get_store_key(position, color)
+        self.result_store.put(key, config, score, depth, move, symmetry)
+
+    def load_stored_result(
+        self, position: Board, color: int, config: str, depth: int
+    ) -> tuple[int, int] | None:
+        """
+        Puts the stored result of position, if any, in the transposition table,
+        so that the search starts from it
+
+        :param depth: depth the move is searched to
+        :return: stored best move if it was searched to depth or position is solved
+        """
+        if self.result_store is None:
+            return None
+        key, symmetry = get_store_key(position, color)
+        stored = self.result_store.get(key, config, symmetry)
+        if stored is None:
+            return None
+        score, stored_depth, move = stored
+        if len(get_legal_moves(position, color, np.array([move]))) == 0:
+            return None
+
+        logging.debug(f"stored result: {move} scored {score} at depth {stored_depth}")
+        if stored_depth >= depth or score in (np.inf, -np.inf):
+            return move
+        tt_key, tt_symmetry = get_transposition_key(position, color)
+        transposition_table.store(
+            tt_key, score, stored_depth, EntryFlag.exact, move, tt_symmetry
+        )
+        return None
+
+    def search_with_aspiration(
+        self,
+        position: Board,
+        color: int,
+        depth: int,
+        previous_score: float,
+        deadline: float | None = None,
+        root_moves: np.ndarray | None = None,
+    ) -> tuple[float, tuple[int, int] | None]:
+        """
+        Searches with a window around the previous iteration's score first and
+        widens the failed side of it to infinity if the score is out of it
+        """
+        alpha = previous_score - self.aspiration_window
+        beta = previous_score + self.aspiration_window
+
+        while True:
+            score, best_next_move = self.search(
+                position, color, depth, deadline, root_moves, alpha, beta
+            )
+            if score <= alpha and alpha != -np.inf:
+                logging.debug(f"aspiration window failed low at depth {depth}")
+                alpha = -np.inf
+            elif score >= beta and beta != np.inf:
+                logging.debug(f"aspiration window failed high at depth {depth}")
+                beta = np.inf
+            else:
+                return score, best_next_move
+
+    def iterative_deepening(
+        self,
+        position: Board,
+        color: int,
+        move_time: float,
+        root_moves: np.ndarray | None = None,
+    ) -> tuple[int, int]:
+        """
+        Searches with depth 1, 2, ... until move_time runs out and returns
+        the best move of the deepest completed iteration. Best moves of previous
+        iterations are kept in the transposition table and searched first.
+        Depth 1 is always completed so there is a move to return.
+        """
+        deadline = time.monotonic() + move_time
+        best_next_move = None
+        score = None
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                if self.algorithm == "pvs" and score is not None:
+                    score, best_next_move = self.search_with_aspiration(
+                        position, color, depth, score, deadline, root_moves
+                    )
+                else:
+                    score, best_next_move = self.search(
+                        position,
+                        color,
+                        depth,
+                        deadline=deadline if depth > 1 else None,
+                        root_moves=root_moves,
+                    )
+            except SearchTimeout:
+                logging.debug(f"search timed out at depth {depth}")
+                break
+
+            logging.debug(f"depth {depth} done: move={best_next_move}, score={score}")
+
+            if score in (np.inf, -np.inf):
+                break
+
         return best_next_move
 
+    def get_move(
+        self, position: Board, color: int, move_time: float | None = None
+    ) -> tuple[int, int]:
+        """
+        :param move_time: search with iterative deepening for this many seconds,
+            to self.calculation_depth if not given
+        """
+        self.start_searching()
+        try:
+            if self.collect_stats:
+                return self.search_move_with_stats(position, color, move_time)
+            return self.search_move(position, color, move_time)
+        finally:
+            self.end_searching()
+
+    def search_move_with_stats(
+        self, position: Board, color: int, move_time: float | None = None
+    ) -> tuple[int, int]:
+        global search_stats
+
+        # counters are reset when the engine starts
+        self.start()
+        search_stats = SearchStats()
+        tt_symmetric_hits = transposition_table.symmetric_hits
+        threat_cache_hits = self.threat_space_search.cache_hits
+        threat_cache_misses = self.threat_space_search.cache_misses
+        move = None
+        try:
+            move = self.search_move(position, color, move_time)
+            return move
+        finally:
+            search_stats.tt_symmetric_hits = (
+                transposition_table.symmetric_hits - tt_symmetric_hits
+            )
+            search_stats.threat_cache_hits = (
+                self.threat_space_search.cache_hits - threat_cache_hits
+            )
+            search_stats.threat_cache_misses = (
+                self.threat_space_search.cache_misses - threat_cache_misses
+            )
+            self.last_stats = search_stats.to_dict()
+            search_stats = None
+            log_stats(
+                self.last_stats,
+                move_idx=position.move_idx,
+                color=color,
+                move=None if move is None else [int(move[0]), int(move[1])],
+                algorithm=self.algorithm,
+            )
+
+    def search_move(
+        self, position: Board, color: int, move_time: float | None = None
+    ) -> tuple[int, int]:
+        global root_best_move
+
+        time_start = time.monotonic()
+        self.move_nodes_start = nodes_searched
+        self.search_depth = 0
+        root_best_move = None
+        self.start()
+        transposition_table.new_search()
+        move_ordering.new_search()
+
+        if self.ponder_hash is not None:
+            logging.debug(
+                f"ponder {'hit' if hash(position) == self.ponder_hash else 'miss'}"
+            )
+            self.ponder_hash = None
+
+        if self.opening_book is not None:
+            book_move = self.opening_book.get_move(position)
+            if (
+                book_move is not None
+                and len(get_legal_moves(position, color, np.array([book_move]))) > 0
+            ):
+                logging.debug(f"book move: {book_move}")
+                return book_move
+
+        store_config = self.get_store_config(move_time)
+        stored_move = self.load_stored_result(
+            position,
+            color,
+            store_config,
+            self.calculation_depth if move_time is None else self.max_depth,
+        )
+        if stored_move is not None:
+            return stored_move
+
+        root_moves = None
+        if self.threat_search:
+            threat_move, root_moves = self.search_threats(
+                position, color, None if move_time is None else move_time / 4
+            )
+            if threat_move is not None:
+                self.store_result(
+                    position, color, store_config, np.inf, solved_depth, threat_move
+                )
+                return threat_move
+
+        self.last_result = None
+        if move_time is None:
+            try:
+                _, best_next_move = self.search(
+                    position, color, self.calculation_depth, root_moves=root_moves
+                )
+            except SearchTimeout:
+                logging.debug(f"search stopped at depth {self.calculation_depth}")
+                best_next_move = None
+        else:
+            best_next_move = self.iterative_deepening(
+                position,
+                color,
+                move_time - (time.monotonic() - time_start),
+                root_moves=root_moves,
+            )
+
+        logging.debug(f"transposition table: {transposition_table.stats()}")
+        if self.last_result is not None:
+            self.store_result(position, color, store_config, *self.last_result)
+        if self.result_store is not None:
+            logging.debug(f"result store: {self.result_store.stats()}")
+
+        if best_next_move is None:
+            best_next_move = self.get_fallback_move(position, color, root_moves)
+        return best_next_move
+
+    def ponder(self, position: Board, color: int):
+        """
+        Searches on the opponent's time until stop is called: guesses the
+        opponent's reply on position and searches the position after it for
+        color with iterative deepening. If the guess is right, get_move finds
+        the results in the transposition table, otherwise it still reuses the
+        common subtrees.
+
+        The caller calls start_searching before running ponder in another
+        thread, so that stop cancels it even if it has not started yet.
+
+        :param position: position with the opponent of color to move
+        """
+        try:
+            if stop_flag.value:
+                return
+            self.start()
+            self.move_nodes_start = nodes_searched
+            self.search_depth = 0
+            reply = self.predict_reply(position, color)
+            if reply is None or not position.is_point_empty(*reply):
+                return
+            ponder_position = position.get_board_after_move(*reply, -color)
+            if ponder_position.update_double_free_three_count_and_check_if_violated(
+                free_three_counter
+            ):
+                return
+
+            logging.debug(f"pondering on reply {reply}")
+            self.ponder_hash = hash(ponder_position)
+            transposition_table.new_search()
+            move_ordering.new_search()
+            if self.threat_search:
+                # fills the threat search cache for get_move
+                self.search_threats(ponder_position, color, None)
+            self.iterative_deepening(ponder_position, color, math.inf)
+        finally:
+            self.end_searching()
+
+    def predict_reply(self, position: Board, color: int) -> tuple[int, int] | None:
+        """
+        :return: the reply of color's opponent expected by color's last search,
+            or the best move of a short search of the opponent if there is none
+        """
+        tt_entry = transposition_table.probe(*get_transposition_key(position, color))
+        if tt_entry is not None and tt_entry[3] is not None:
+            return tt_entry[3]
+        try:
+            return self.search(position, -color, 2)[1]
+        except SearchTimeout:
+            return None
+
+    @staticmethod
+    def get_fallback_move(
+        position: Board, color: int, root_moves: np.ndarray | None
+    ) -> tuple[int, int] | None:
+        """
+        :return: move for a search stopped before completing any depth: the best
+            root move searched so far or else the first legal one
+        """
+        if root_best_move is not None:
+            return root_best_move
+        moves = (
+            root_moves if root_moves is not None else get_next_moves(position, color)[0]
+        )
+        if len(moves) == 0:
+            return None
+        return tuple(moves[0].tolist())
+
+    def search_threats(
+        self, position: Board, color: int, time_limit: float | None
+    ) -> tuple[tuple[int, int] | None, np.ndarray | None]:
+        """
+        :param time_limit: seconds for all threat searches together, at most
+            the limit of ThreatSpaceSearch
+        :return: first move of own forced win, if found, and otherwise moves
+            refuting the opponent's forced win, if it has one
+        """
+        if time_limit is None or time_limit > self.threat_space_search.time_limit:
+            time_limit = self.threat_space_search.time_limit
+        deadline = time.monotonic() + time_limit
+
+        for vct in (False, True):
+            threat_move = self.threat_space_search.find_win(
+                position, color, vct=vct, time_limit=deadline - time.monotonic()
+            )
+            if threat_move is not None:
+                logging.debug(f"forced win found, vct={vct}: {threat_move}")
+                return threat_move, None
+
+        root_moves = self.threat_space_search.find_defenses(
+            position,
+            color,
+            position.get_candidate_moves(),
+            time_limit=deadline - time.monotonic(),
+        )
+        if root_moves is not None:
+            logging.debug(f"defending against forced win: {root_moves.tolist()}")
+        return None, root_moves
+
+
+class AIPlayer(Player):
+    def __init__(self, color, move_time: float | None = None, ponder: bool = False):
+        super().__init__(color)
+
+        self.move_time = move_time
+        # search on the time of a human opponent, see SearchEngine.ponder
+        self.ponder = ponder
+        self.h = build_heuristic(self.color, Heuristics.count)
+
+        # engine of own, if gameplay does not share one with set_search_engine
+        self.own_search_engine = None
+
+    def get_move(self, position: Board) -> tuple[int, int]:
+        move = self.search_engine.get_move(position, self.color, self.move_time)
+        self.last_move_stats = self.search_engine.last_stats
+        return move
+
     def start_game(self):
-        self.manager = Manager()
-        self.pool = self.manager.Pool(processes=self.max_workers)
+        if self.search_engine is None:
+            self.own_search_engine = SearchEngine()
+            self.search_engine = self.own_search_engine
+        self.search_engine.start()
 
     def end_game(self):
-        self.manager.shutdown()
+        if self.own_search_engine is not None:
+            self.own_search_engine.close()
+            self.search_engine = self.own_search_engine = None
@@ -17,10 +17,16 @@ class Player(ABC):
         )
 
         self.move_getter = None
+        self.search_engine = None
+        # SearchStats.to_dict of the last move, if it was searched with stats
+        self.last_move_stats = None
 
     def set_move_getter(self, move_getter):
         self.move_getter = move_getter
 
+    def set_search_engine(self, search_engine):
+        self.search_engine = search_engine
+
     def get_move(self, position: Board) -> tuple[int, int]:
         raise NotImplementedError()
 
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from board import Board
+from symmetry import get_canonical_hash, inverse_transform_points, transform_points
+
+book_magic = b"GMKB"
+book_version = 1
+
+header_dtype = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u2"),
+        ("board_size", "<u2"),
+        ("n_entries", "<u8"),
+    ]
+)
+
+# entries are sorted by key, the canonical hash of the position, and the move
+# is in the coordinates of the canonical position
+entry_dtype = np.dtype(
+    [
+        ("key", "<u8"),
+        ("move", "<u2"),
+        ("depth", "u1"),
+        ("score", "<f4"),
+    ]
+)
+
+default_book_path = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "book", "openings.book"
+)
+
+
+def get_book_entry(board: Board, move: tuple[int, int], depth: int, score: float):
+    """
+    :return: key of board and the entry of move on it, to be written by write_book
+    """
+    key, symmetry = get_canonical_hash(board)
+    x, y = transform_points(np.array(move), symmetry).tolist()
+    return key, (key, x * Board.size + y, depth, score)
+
+
+def write_book(path: str, entries: dict[int, tuple]):
+    """
+    :param entries: entries of get_book_entry by key
+    """
+    header = np.array(
+        [(book_magic, book_version, Board.size, len(entries))], dtype=header_dtype
+    )
+    table = np.array([entries[key] for key in sorted(entries)], dtype=entry_dtype)
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+
+
+class OpeningBook:
+    """
+    Best moves of opening positions, found by deep searches. The file is
+    memory-mapped and positions are looked up by binary search of their
+    canonical hash, so that all symmetric positions share one entry and
+    opening the book reads only its header.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+        header = np.frombuffer(self.data, dtype=header_dtype, count=1)[0]
+        if header["magic"] != book_magic or header["version"] != book_version:
+            raise ValueError(f"{path} is not an opening book of version {book_version}")
+        if header["board_size"] != Board.size:
+            raise ValueError(f"{path} is a book of board size {header['board_size']}")
+
+        self.entries = np.frombuffer(
+            self.data,
+            dtype=entry_dtype,
+            count=int(header["n_entries"]),
+            offset=header_dtype.itemsize,
+        )
+        self.keys = self.entries["key"]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_move(self, board: Board) -> tuple[int, int] | None:
+        """
+        :return: book move of the side to move on board, None if it is not in
+            the book
+        """
+        key, symmetry = get_canonical_hash(board)
+        idx = int(np.searchsorted(self.keys, np.uint64(key)))
+        if idx == len(self.keys) or self.keys[idx] != key:
+            return None
+        move = np.array(divmod(int(self.entries[idx]["move"]), Board.size))
+        x, y = inverse_transform_points(move, symmetry).tolist()
+        if not board.is_point_empty(x, y):
+            return None
+        return x, y
+
+
+def load_opening_book(path: str | None) -> OpeningBook | None:
+    """
+    :return: None if path is empty or there is no file
+    """
+    if not path or not os.path.isfile(path):
+        return None
+    return OpeningBook(path)
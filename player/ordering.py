@@ -0,0 +1,53 @@
+import numpy as np
+
+from board import Board, color_index
+from player.transposition import no_move
+
+
+def get_flat_moves(moves: np.ndarray) -> np.ndarray:
+    return moves[:, 0] * Board.size + moves[:, 1]
+
+
+class MoveOrdering:
+    """
+    Search history used to order moves of a node:
+    killer moves - quiet moves which caused a beta cutoff at the same ply,
+    so likely to cause it in the sibling subtrees too;
+    history - for every color and move, sum of depth ** 2 of the cutoffs it caused
+    anywhere in the tree.
+    """
+
+    n_killers = 2
+
+    def __init__(self, max_ply: int = 64):
+        self.killers = np.full((max_ply, self.n_killers), no_move, dtype=int)
+        self.history = np.zeros((2, Board.size * Board.size), dtype=np.int64)
+
+    def new_search(self):
+        """
+        Killers are only valid for plies of one search, history is kept with
+        less weight than the cutoffs of the new search
+        """
+        self.killers.fill(no_move)
+        self.history //= 2
+
+    def clear(self):
+        self.killers.fill(no_move)
+        self.history.fill(0)
+
+    def add_cutoff(self, ply: int, color: int, move: tuple[int, int], depth: int):
+        flat_move = int(move[0]) * Board.size + int(move[1])
+        self.history[color_index(color), flat_move] += depth**2
+
+        if ply >= len(self.killers) or self.killers[ply, 0] == flat_move:
+            return
+        self.killers[ply, 1:] = self.killers[ply, :-1]
+        self.killers[ply, 0] = flat_move
+
+    def get_killers_mask(self, ply: int, moves: np.ndarray) -> np.ndarray:
+        if ply >= len(self.killers):
+            return np.zeros((len(moves),), dtype=bool)
+        return np.isin(get_flat_moves(moves), self.killers[ply])
+
+    def get_history(self, color: int, moves: np.ndarray) -> np.ndarray:
+        return self.history[color_index(color), get_flat_moves(moves)]
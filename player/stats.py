@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+# structured log of search stats, one json object per move
+stats_logger = logging.getLogger("gomoku.search_stats")
+
+timers = ("move_generation", "move_ordering", "board_update", "evaluation")
+
+
+class SearchStats:
+    """
+    Counters of one move's search, collected by the search functions of
+    player.ai while SearchEngine.collect_stats is on. Only the process searching
+    the move counts, Lazy SMP helpers do not.
+    """
+
+    def __init__(self, max_ply: int = 64):
+        self.max_ply = max_ply
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.evaluations = 0
+        self.tt_hits = 0
+        self.tt_misses = 0
+        self.tt_cutoffs = 0
+        # hits on entries of another orientation of the position, with SYMMETRIC_TT
+        self.tt_symmetric_hits = 0
+        self.threat_cache_hits = 0
+        self.threat_cache_misses = 0
+        self.depth = 0
+        # nodes visited and moves generated in the expanded ones, per ply
+        self.nodes_by_ply = np.zeros((self.max_ply,), dtype=np.int64)
+        self.moves_by_ply = np.zeros((self.max_ply,), dtype=np.int64)
+        self.expanded_by_ply = np.zeros((self.max_ply,), dtype=np.int64)
+        self.times = dict.fromkeys(timers, 0.0)
+        self.time_start = time.perf_counter()
+
+    def add_node(self, ply: int):
+        self.nodes += 1
+        if ply < self.max_ply:
+            self.nodes_by_ply[ply] += 1
+
+    def add_expanded_node(self, ply: int, n_moves: int):
+        if ply < self.max_ply:
+            self.expanded_by_ply[ply] += 1
+            self.moves_by_ply[ply] += n_moves
+
+    def add_tt_probe(self, is_hit: bool):
+        if is_hit:
+            self.tt_hits += 1
+        else:
+            self.tt_misses += 1
+
+    def add_time(self, timer: str, seconds: float):
+        self.times[timer] += seconds
+
+    def get_branching_factors(self) -> list[float]:
+        """
+        :return: mean number of moves generated in expanded nodes, per ply
+        """
+        n_plies = int(np.count_nonzero(self.expanded_by_ply))
+        return (self.moves_by_ply[:n_plies] / self.expanded_by_ply[:n_plies]).tolist()
+
+    def get_effective_branching_factors(self) -> list[float]:
+        """
+        :return: nodes visited at a ply per node visited at the previous one,
+            lower than get_branching_factors by the cut off moves
+        """
+        n_plies = int(np.count_nonzero(self.nodes_by_ply))
+        if n_plies < 2:
+            return []
+        return (
+            self.nodes_by_ply[1:n_plies] / self.nodes_by_ply[: n_plies - 1]
+        ).tolist()
+
+    def to_dict(self) -> dict:
+        wall_time = time.perf_counter() - self.time_start
+        n_probes = self.tt_hits + self.tt_misses
+        return {
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "nodes_per_sec": self.nodes / wall_time if wall_time > 0 else 0.0,
+            "wall_time": wall_time,
+            "cutoffs": self.cutoffs,
+            "evaluations": self.evaluations,
+            "tt_hits": self.tt_hits,
+            "tt_misses": self.tt_misses,
+            "tt_hit_rate": self.tt_hits / n_probes if n_probes > 0 else 0.0,
+            "tt_cutoffs": self.tt_cutoffs,
+            "tt_symmetric_hits": self.tt_symmetric_hits,
+            "tt_symmetric_hit_rate": (
+                self.tt_symmetric_hits / n_probes if n_probes > 0 else 0.0
+            ),
+            "threat_cache_hits": self.threat_cache_hits,
+            "threat_cache_misses": self.threat_cache_misses,
+            "nodes_by_ply": self.nodes_by_ply[
+                : int(np.count_nonzero(self.nodes_by_ply))
+            ].tolist(),
+            "branching_factors": self.get_branching_factors(),
+            "effective_branching_factors": self.get_effective_branching_factors(),
+            "times": dict(self.times),
+        }
+
+
+def format_stats(stats: dict) -> str:
+    """
+    :param stats: SearchStats.to_dict result
+    """
+    times = ", ".join(f"{k} {v:.3f}s" for k, v in stats["times"].items())
+    branching = " ".join(f"{b:.1f}" for b in stats["effective_branching_factors"])
+    tt_hit_rate = f"{stats['tt_hit_rate']:.2f}"
+    if stats["tt_symmetric_hits"] > 0:
+        tt_hit_rate += f" ({stats['tt_symmetric_hit_rate']:.2f} symmetric)"
+    return (
+        f"depth {stats['depth']}, {stats['nodes']} nodes in {stats['wall_time']:.3f}s "
+        f"({stats['nodes_per_sec']:.0f}/s), {stats['cutoffs']} cutoffs, "
+        f"tt hit rate {tt_hit_rate}, branching [{branching}], {times}"
+    )
+
+
+def add_log_file(path: str):
+    """
+    Writes the structured log to path, as json lines, instead of the root logger
+    """
+    if any(
+        getattr(handler, "baseFilename", None) == os.path.abspath(path)
+        for handler in stats_logger.handlers
+    ):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    stats_logger.addHandler(handler)
+    stats_logger.setLevel(logging.INFO)
+    stats_logger.propagate = False
+
+
+def log_stats(stats: dict, **fields):
+    stats_logger.info(json.dumps(fields | stats))
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+
+from board import Board
+from symmetry import inverse_transform_point, transform_point
+
+# depth of positions solved by the threat search, deeper than any search
+solved_depth = 255
+
+store_version = 1
+
+
+def to_sqlite_int(key: int) -> int:
+    # sqlite integers are signed 64 bit
+    return key - 2**64 if key >= 2**63 else key
+
+
+class ResultStore:
+    """
+    Results of deep searches and solved positions which outlive the process:
+    score, depth and best move by position key and engine config, in an sqlite
+    database. The config is a string of every setting which changes the move,
+    so engines of a tournament never play each other's results. The database
+    is in WAL mode, so any number of processes read it while one of them writes.
+
+    Keys are canonical hashes, as in the opening book, and moves are stored
+    in the coordinates of the canonical position, so that symmetric positions
+    share one row.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+            if version != store_version:
+                # results of an older layout are dropped
+                self.connection.execute("DROP TABLE IF EXISTS results")
+                self.connection.execute(f"PRAGMA user_version = {store_version}")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key INTEGER NOT NULL, config TEXT NOT NULL, score REAL NOT NULL, "
+                "depth INTEGER NOT NULL, move INTEGER NOT NULL, "
+                "PRIMARY KEY (key, config)) WITHOUT ROWID"
+            )
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(
+        self, key: int, config: str, symmetry: int = 0
+    ) -> tuple[float, int, tuple[int, int]] | None:
+        """
+        :param symmetry: symmetry which maps the position to the one of key
+        :return: (score, depth, best move) if key is stored for config, None
+            otherwise
+        """
+        row = self.connection.execute(
+            "SELECT score, depth, move FROM results WHERE key = ? AND config = ?",
+            (to_sqlite_int(key), config),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        score, depth, move = row
+        return (
+            score,
+            depth,
+            inverse_transform_point(*divmod(move, Board.size), symmetry),
+        )
+
+    def put(
+        self,
+        key: int,
+        config: str,
+        score: float,
+        depth: int,
+        move: tuple[int, int],
+        symmetry: int = 0,
+    ):
+        """
+        Stores the result unless one of a greater depth is stored
+        """
+        x, y = transform_point(int(move[0]), int(move[1]), symmetry)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key, config) DO UPDATE "
+                "SET score = excluded.score, depth = excluded.depth, "
+                "move = excluded.move WHERE excluded.depth >= results.depth",
+                (to_sqlite_int(key), config, float(score), depth, x * Board.size + y),
+            )
+        self.stores += 1
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores}
+
+    def close(self):
+        self.connection.close()
+
+
+def load_result_store(path: str | None) -> ResultStore | None:
+    """
+    :return: None if path is empty
+    """
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return ResultStore(path)
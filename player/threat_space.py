@@ -0,0 +1,231 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+from board import Board
+from heuristics.sliding import Heuristics, build_heuristic
+from heuristics.threats import (
+    get_five_cells,
+    get_forced_moves,
+    get_four_cells,
+    get_three_cells,
+    has_five,
+)
+
+free_three_counter = build_heuristic(None, Heuristics.free_three, line_len_to_analyze=6)
+
+
+class ThreatSearchLimit(Exception):
+    pass
+
+
+def is_won_by(board: Board, color: int) -> bool:
+    return board.get_captures(color) >= 5 or has_five(board.position, color)
+
+
+def flat_to_moves(cells: np.ndarray) -> list[tuple[int, int]]:
+    return [divmod(int(cell), Board.size) for cell in cells]
+
+
+class ThreatSpaceSearch:
+    """
+    Searches for forced wins where every attacker move is a four (VCF) or
+    also a free three (VCT), so the defender has only a few replies: blocks,
+    captures and own fours. Lines are followed much deeper than by minimax,
+    limited by number of attacker moves, nodes and time per call.
+
+    Results are cached per (position hash, attacker, vct): wins for good,
+    failures together with the depth they were searched to.
+    """
+
+    max_cache_entries = 2**16
+
+    def __init__(self):
+        # max number of attacker moves in a line
+        self.max_depth = int(os.getenv("THREAT_SEARCH_DEPTH", "10"))
+        # max number of positions and seconds of one call
+        self.max_nodes = int(os.getenv("THREAT_SEARCH_NODES", "2000"))
+        self.time_limit = float(os.getenv("THREAT_SEARCH_TIME", "0.25"))
+
+        self.cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.n_nodes = 0
+        self.deadline = None
+
+    def clear(self):
+        self.cache.clear()
+
+    def find_win(
+        self,
+        board: Board,
+        attacker: int,
+        vct: bool = False,
+        time_limit: float | None = None,
+    ) -> tuple[int, int] | None:
+        """
+        :param time_limit: seconds for this call if less than self.time_limit
+        :return: first move of a forced win of attacker, moving next on board,
+            None if there is none or it was not found within the limits
+        """
+        self.start_call(time_limit)
+        try:
+            return self.attack(board, attacker, self.max_depth, vct)
+        except ThreatSearchLimit:
+            logging.debug(f"threat search stopped after {self.n_nodes} nodes")
+            return None
+
+    def find_defenses(
+        self,
+        board: Board,
+        color: int,
+        candidate_moves: np.ndarray,
+        time_limit: float | None = None,
+    ) -> np.ndarray | None:
+        """
+        Checks if the opponent of color, were it to move, has a VCF, and if so,
+        which moves of color refute it. Tried moves are the cells of the
+        opponent's fours and fives, own fours and captures.
+
+        :return: refuting moves of shape (n, 2), None if color is not threatened
+            or no refutation was found within the limits
+        """
+        self.start_call(time_limit)
+        try:
+            return self.search_defenses(board, color, candidate_moves)
+        except ThreatSearchLimit:
+            logging.debug(f"threat search stopped after {self.n_nodes} nodes")
+            return None
+
+    def start_call(self, time_limit: float | None = None):
+        if time_limit is None or time_limit > self.time_limit:
+            time_limit = self.time_limit
+        self.n_nodes = 0
+        self.deadline = time.monotonic() + time_limit
+        if len(self.cache) > self.max_cache_entries:
+            self.cache.clear()
+
+    def search_defenses(
+        self, board: Board, color: int, candidate_moves: np.ndarray
+    ) -> np.ndarray | None:
+        opponent = -color
+        if self.attack(board, opponent, self.max_depth, False) is None:
+            return None
+
+        cells = np.union1d(
+            np.union1d(
+                get_four_cells(board.position, opponent),
+                get_five_cells(board.position, opponent),
+            ),
+            get_four_cells(board.position, color),
+        )
+        capturing_moves = candidate_moves[
+            board.get_capturing_moves_mask(candidate_moves, color)
+        ]
+        tried_moves = set(flat_to_moves(cells)) | set(
+            map(tuple, capturing_moves.tolist())
+        )
+
+        defenses = []
+        for x, y in sorted(tried_moves):
+            position = self.make_move(board, x, y, color)
+            if (
+                position is not None
+                and self.attack(position, opponent, self.max_depth, False) is None
+            ):
+                defenses.append((x, y))
+
+        if len(defenses) == 0:
+            return None
+        return np.array(defenses, dtype=int)
+
+    def make_move(self, board: Board, x: int, y: int, color: int) -> Board | None:
+        """
+        :return: position after move, None if the move is illegal
+        """
+        if time.monotonic() > self.deadline or self.n_nodes >= self.max_nodes:
+            raise ThreatSearchLimit()
+        self.n_nodes += 1
+
+        if not board.is_point_empty(x, y):
+            return None
+        position = board.get_board_after_move(x, y, color)
+        if position.update_double_free_three_count_and_check_if_violated(
+            free_three_counter
+        ):
+            return None
+        return position
+
+    def attack(
+        self, board: Board, attacker: int, depth: int, vct: bool
+    ) -> tuple[int, int] | None:
+        cache_key = (board.hash, attacker, vct)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            move, searched_depth = cached
+            if move is not None or searched_depth >= depth:
+                self.cache_hits += 1
+                return move
+        self.cache_misses += 1
+
+        win_cells = get_five_cells(board.position, attacker)
+        if len(win_cells) > 0:
+            move = divmod(int(win_cells[0]), Board.size)
+            self.cache[cache_key] = (move, depth)
+            return move
+
+        if depth == 0:
+            return None
+
+        defender_win_cells = get_five_cells(board.position, -attacker)
+        if len(defender_win_cells) > 0:
+            # attacker has to block, the block may still be a threat
+            cells = defender_win_cells
+        elif vct:
+            cells = np.union1d(
+                get_four_cells(board.position, attacker),
+                get_three_cells(board.position, attacker),
+            )
+        else:
+            cells = get_four_cells(board.position, attacker)
+
+        result = None
+        for x, y in flat_to_moves(cells):
+            position = self.make_move(board, x, y, attacker)
+            if position is None:
+                continue
+            if is_won_by(position, attacker) or self.defend(
+                position, attacker, depth - 1, vct
+            ):
+                result = (x, y)
+                break
+
+        self.cache[cache_key] = (result, depth)
+        return result
+
+    def defend(self, board: Board, attacker: int, depth: int, vct: bool) -> bool:
+        """
+        :return: True if attacker wins after every reply of defender
+        """
+        defender = -attacker
+
+        if len(get_five_cells(board.position, defender)) > 0:
+            return False
+
+        replies = get_forced_moves(board, defender, board.get_candidate_moves())
+        if replies is None:
+            # the last attacker move was not a threat
+            return False
+
+        for x, y in replies.tolist():
+            position = self.make_move(board, x, y, defender)
+            if position is None:
+                continue
+            if is_won_by(position, defender):
+                return False
+            if self.attack(position, attacker, depth, vct) is None:
+                return False
+
+        return True
@@ -0,0 +1,191 @@
+import ctypes
+import struct
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+from board import Board
+from symmetry import inverse_transform_point, transform_point
+
+
+class EntryFlag:
+    empty = 0
+    exact = 1
+    lower_bound = 2
+    upper_bound = 3
+
+
+entry_dtype = np.dtype(
+    [
+        ("key", np.uint64),
+        ("score", np.float64),
+        ("move", np.int16),
+        ("depth", np.int8),
+        ("flag", np.int8),
+        ("age", np.uint8),
+    ]
+)
+
+# moves are stored as cell index in the low 9 bits and, above them, the
+# symmetry which maps the searched position to the one of its key
+no_move = 0x1FF
+move_bits = 9
+
+
+def encode_move(move: tuple[int, int] | None, symmetry: int = 0) -> int:
+    if move is None:
+        return no_move | symmetry << move_bits
+    x, y = transform_point(int(move[0]), int(move[1]), symmetry)
+    return (x * Board.size + y) | symmetry << move_bits
+
+
+def decode_move(move: int, symmetry: int = 0) -> tuple[int, int] | None:
+    """
+    :param symmetry: symmetry of the probed position, the move is mapped back to it
+    """
+    cell = move & no_move
+    if cell == no_move:
+        return None
+    return inverse_transform_point(*divmod(cell, Board.size), symmetry)
+
+
+def get_entry_check(
+    key: int, score: float, move: int, depth: int, flag: int, age: int
+) -> int:
+    """
+    Key is stored xor-ed with the rest of the entry, so an entry torn by
+    concurrent writes of two processes does not match any key when probed
+    """
+    (score_bits,) = struct.unpack("<Q", struct.pack("<d", score))
+    return (
+        key
+        ^ score_bits
+        ^ (move & 0xFFFF)
+        ^ ((depth & 0xFF) << 16)
+        ^ (flag << 24)
+        ^ (age << 32)
+    )
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table of search results. Every slot holds one entry, a new
+    entry replaces the stored one if the stored one is from an older search or
+    was searched to a smaller depth.
+
+    A shared table lives in shared memory and is passed to pool processes as
+    initializer argument, then all of them probe and store the same entries.
+    """
+
+    def __init__(self, size_mb: float = 64, shared: bool = False):
+        self.n_entries = max(1, int(size_mb * 2**20) // entry_dtype.itemsize)
+        self.shared = shared
+        if shared:
+            self.buffer = RawArray(ctypes.c_byte, self.n_entries * entry_dtype.itemsize)
+            self.table = np.frombuffer(self.buffer, dtype=entry_dtype)
+        else:
+            self.buffer = None
+            self.table = np.zeros((self.n_entries,), dtype=entry_dtype)
+        self.age = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stores = 0
+        # hits on entries stored from another orientation of the position,
+        # which plain Zobrist keys would have missed
+        self.symmetric_hits = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.table.fill(0)
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stores = 0
+        self.symmetric_hits = 0
+
+    def probe(
+        self, key: int, symmetry: int = 0
+    ) -> tuple[float, int, int, tuple[int, int] | None] | None:
+        """
+        :param symmetry: symmetry which maps the position to the one of key
+        :return: (score, depth, flag, best move) if key is stored, None otherwise
+        """
+        stored_check, score, move, depth, flag, age = self.table[
+            key % self.n_entries
+        ].item()
+
+        if flag == EntryFlag.empty or stored_check != get_entry_check(
+            key, score, move, depth, flag, age
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if move >> move_bits != symmetry:
+            self.symmetric_hits += 1
+        return score, depth, flag, decode_move(move, symmetry)
+
+    def store(
+        self,
+        key: int,
+        score: float,
+        depth: int,
+        flag: int,
+        move: tuple[int, int] | None,
+        symmetry: int = 0,
+    ):
+        idx = key % self.n_entries
+        stored_entry = self.table[idx].item()
+        stored_check, _, _, stored_depth, stored_flag, stored_age = stored_entry
+
+        if stored_flag != EntryFlag.empty:
+            if stored_age == self.age and stored_depth > depth:
+                return
+            if stored_check != get_entry_check(key, *stored_entry[1:]):
+                self.evictions += 1
+
+        self.stores += 1
+        move = encode_move(move, symmetry)
+        self.table[idx] = (
+            get_entry_check(key, score, move, depth, flag, self.age),
+            score,
+            move,
+            depth,
+            flag,
+            self.age,
+        )
+
+    def stats(self) -> dict[str, int | float]:
+        n_probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / n_probes if n_probes > 0 else 0.0,
+            "symmetric_hits": self.symmetric_hits,
+            "symmetric_hit_rate": (
+                self.symmetric_hits / n_probes if n_probes > 0 else 0.0
+            ),
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "size_mb": self.table.nbytes / 2**20,
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.shared:
+            # the array is rebuilt over the same shared buffer
+            del state["table"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared:
+            self.table = np.frombuffer(self.buffer, dtype=entry_dtype)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from board import Board, zobrist_stones
+
+# symmetries of the square board: rotations by 0, 90, 180 and 270 degrees,
+# each with and without transposition
+n_symmetries = 8
+
+zobrist_stones_array = np.array(zobrist_stones, dtype=np.uint64)
+
+
+def transform_point(x, y, symmetry: int):
+    """
+    :param x: row of the cell, an int or an array of rows
+    :param y: column of the cell, an int or an array of columns
+    :param symmetry: 0 to 7, bit 2 transposes, then bits 0 and 1 rotate by
+        90 degrees as many times
+    """
+    last = Board.size - 1
+    if symmetry & 4:
+        x, y = y, x
+    for _ in range(symmetry & 3):
+        x, y = y, last - x
+    return x, y
+
+
+def inverse_transform_point(x, y, symmetry: int):
+    last = Board.size - 1
+    for _ in range(symmetry & 3):
+        x, y = last - y, x
+    if symmetry & 4:
+        x, y = y, x
+    return x, y
+
+
+def transform_points(points: np.ndarray, symmetry: int) -> np.ndarray:
+    """
+    :param points: cells of shape (..., 2)
+    """
+    return np.stack(transform_point(points[..., 0], points[..., 1], symmetry), axis=-1)
+
+
+def inverse_transform_points(points: np.ndarray, symmetry: int) -> np.ndarray:
+    return np.stack(
+        inverse_transform_point(points[..., 0], points[..., 1], symmetry), axis=-1
+    )
+
+
+def get_stones_hash(color_idx: np.ndarray, points: np.ndarray) -> np.uint64:
+    return np.bitwise_xor.reduce(
+        zobrist_stones_array[color_idx, points[:, 0], points[:, 1]],
+        initial=np.uint64(0),
+    )
+
+
+def get_symmetric_hashes(board: Board) -> np.ndarray:
+    """
+    :return: Zobrist hashes of board transformed by every symmetry, of shape
+        (n_symmetries,). Side to move and captures keys are the same in all.
+    """
+    points = np.argwhere(board.position != Board.empty_color)
+    color_idx = (board.position[points[:, 0], points[:, 1]] != 1).astype(int)
+    rest = np.uint64(hash(board)) ^ get_stones_hash(color_idx, points)
+    return np.array(
+        [
+            rest ^ get_stones_hash(color_idx, transform_points(points, symmetry))
+            for symmetry in range(n_symmetries)
+        ],
+        dtype=np.uint64,
+    )
+
+
+def get_canonical_hash(board: Board) -> tuple[int, int]:
+    """
+    :return: smallest hash of the symmetric positions of board, the same for
+        all of them, and the symmetry which transforms board to that position
+    """
+    hashes = get_symmetric_hashes(board)
+    symmetry = int(np.argmin(hashes))
+    return int(hashes[symmetry]), symmetry
@@ -0,0 +1,36 @@
+import numpy as np
+
+from bitboard import BitBoard, position_to_bits
+
+# the last move captures (9, 10) and (9, 11)
+moves = [(9, 9, -1), (9, 10, 1), (10, 10, -1), (9, 11, 1), (8, 8, 1), (9, 12, -1)]
+
+
+def assert_stones_match_position(board: BitBoard):
+    assert board.stones == [
+        position_to_bits(board.position, 1),
+        position_to_bits(board.position, -1),
+    ]
+
+
+def test_child_stones_follow_moves_and_captures():
+    board = BitBoard()
+    for x, y, color in moves:
+        board = board.get_board_after_move(x, y, color)
+        assert_stones_match_position(board)
+    assert board.get_captures(-1) == 1
+    assert board.is_point_empty(9, 10) and board.is_point_empty(9, 11)
+    # the parent keeps its own stones
+    assert not board.parent.is_point_empty(9, 10)
+    assert_stones_match_position(board.parent)
+
+
+def test_make_and_undo_move_restore_stones():
+    board = BitBoard()
+    for x, y, color in moves:
+        board.make_move(x, y, color)
+        assert_stones_match_position(board)
+    for _ in moves:
+        board.undo_move()
+        assert_stones_match_position(board)
+    assert not np.any(board.position)
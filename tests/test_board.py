@@ -0,0 +1,15 @@
+from bitboard import BitBoard
+from board import Board
+
+
+def get_child(board_class: type[Board]) -> Board:
+    return board_class().get_board_after_move(9, 9, -1).get_board_after_move(9, 10, 1)
+
+
+def test_size_counts_every_array():
+    board = get_child(Board)
+    assert (
+        board.get_size_in_bytes()
+        > board.position.nbytes + board.candidate_counts.nbytes
+    )
+    assert get_child(BitBoard).get_size_in_bytes() > board.get_size_in_bytes()
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+import player.ai as ai
+from board import Board
+from gameplay.base import BaseGameplay
+from player.ai import AIPlayer
+from player.human import HumanPlayer
+
+
+@pytest.fixture
+def gameplay(monkeypatch):
+    monkeypatch.setenv("SEARCH_WORKERS", "1")
+    monkeypatch.setenv("OPENING_BOOK", "")
+    gameplay = BaseGameplay(HumanPlayer(-1), AIPlayer(1, ponder=True))
+    gameplay.board = (
+        Board().get_board_after_move(9, 9, -1).get_board_after_move(9, 10, 1)
+    )
+    gameplay.move_idx = 2
+    gameplay.active_player, gameplay.passive_player = gameplay.players
+    yield gameplay
+    # ends a ponder whose stop was lost, so that a failing test does not hang
+    ai.stop_flag.value = True
+    gameplay.search_executor.shutdown()
+    ai.stop_flag.value = False
+    gameplay.search_engine.close()
+
+
+def stop_pondering_with_timeout(gameplay: BaseGameplay, timeout: float) -> bool:
+    """
+    :return: whether stop_pondering returned in timeout seconds
+    """
+    thread = threading.Thread(target=gameplay.stop_pondering, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_stop_before_ponder_runs(gameplay):
+    executor_free = threading.Event()
+    # keeps ponder queued in the executor until it is stopped
+    gameplay.search_executor.submit(executor_free.wait)
+    gameplay.start_pondering()
+    threading.Timer(0.05, executor_free.set).start()
+
+    assert stop_pondering_with_timeout(gameplay, 10)
+    assert not gameplay.search_engine.is_searching
+
+
+def test_stop_immediately_after_start(gameplay):
+    gameplay.start_pondering()
+
+    assert stop_pondering_with_timeout(gameplay, 10)
+    assert not gameplay.search_engine.is_searching
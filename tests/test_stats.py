@@ -0,0 +1,24 @@
+from board import Board
+from player.ai import SearchEngine
+from player.stats import SearchStats, format_stats
+
+
+def test_branching_factors_without_nodes():
+    stats = SearchStats()
+    assert stats.get_effective_branching_factors() == []
+    stats.add_node(0)
+    assert stats.get_effective_branching_factors() == []
+    assert "branching []" in format_stats(stats.to_dict())
+
+
+def test_stats_of_move_without_search(monkeypatch):
+    monkeypatch.setenv("SEARCH_WORKERS", "1")
+    monkeypatch.setenv("SEARCH_STATS", "1")
+    engine = SearchEngine()
+    # the empty board is in the opening book, so no node is searched
+    try:
+        assert engine.get_move(Board(), -1) is not None
+    finally:
+        engine.close()
+    assert engine.last_stats["nodes"] == 0
+    assert engine.last_stats["effective_branching_factors"] == []
@@ -0,0 +1,49 @@
+import pytest
+
+from board import Board
+from player.ai import SearchEngine, get_store_key
+
+
+@pytest.fixture
+def position():
+    board = Board()
+    for x, y, color in [(9, 9, -1), (9, 10, 1), (10, 10, -1), (8, 8, 1)]:
+        board = board.get_board_after_move(x, y, color)
+    return board
+
+
+def get_engine(monkeypatch, tmp_path, **settings) -> SearchEngine:
+    monkeypatch.setenv("SEARCH_WORKERS", "1")
+    monkeypatch.setenv("OPENING_BOOK", "")
+    monkeypatch.setenv("RESULT_STORE", str(tmp_path / "results.db"))
+    monkeypatch.setenv("RESULT_STORE_MIN_DEPTH", "1")
+    engine = SearchEngine()
+    for key, value in settings.items():
+        setattr(engine, key, value)
+    return engine
+
+
+def test_results_are_kept_per_engine_config(monkeypatch, tmp_path, position):
+    engine = get_engine(monkeypatch, tmp_path, calculation_depth=2)
+    move = engine.get_move(position, -1)
+    engine.close()
+
+    key, symmetry = get_store_key(position, -1)
+    config = engine.get_store_config(None)
+    assert engine.result_store.get(key, config, symmetry)[2] == tuple(move)
+
+    # a different engine searches and stores its own result
+    other = get_engine(monkeypatch, tmp_path, calculation_depth=2, algorithm="pvs")
+    other.get_move(position, -1)
+    other.close()
+    other_config = other.get_store_config(None)
+    assert other_config != config
+    assert other.result_store.stores == 1
+    assert len(other.result_store) == 2
+
+    # the same config plays the stored move without storing it again
+    same = get_engine(monkeypatch, tmp_path, calculation_depth=2)
+    assert tuple(same.get_move(position, -1)) == tuple(move)
+    same.close()
+    assert same.result_store.hits == 1
+    assert same.result_store.stores == 0
@@ -0,0 +1,44 @@
+from board import Board
+from gameplay.record import GameArchive, append_games
+from tournament.runner import init_worker, play_game, winner_heuristic
+
+# color -1 to move, its only five is the overline at (9, 6)
+overline_opening = [
+    [9, 3, -1],
+    [0, 0, 1],
+    [9, 4, -1],
+    [0, 2, 1],
+    [9, 5, -1],
+    [0, 4, 1],
+    [9, 7, -1],
+    [0, 6, 1],
+    [9, 8, -1],
+    [18, 18, 1],
+]
+
+
+def test_overline_winner_is_color():
+    board = Board()
+    for x, y, color in overline_opening + [[9, 6, -1]]:
+        board = board.get_board_after_move(x, y, color)
+    assert board.winner(winner_heuristic) == -1
+
+
+def test_overline_game(tmp_path):
+    init_worker([{"name": "a", "depth": 2}, {"name": "b", "depth": 2}], 1)
+    result = play_game(
+        {
+            "game": 0,
+            "first": "a",
+            "second": "b",
+            "opening": overline_opening,
+            "board_backend": "array",
+            "max_moves": 20,
+        }
+    )
+    assert result["reason"] == "win"
+    assert result["winner"] == "a"
+
+    path = tmp_path / "games.record"
+    append_games(str(path), [result["record"]])
+    assert GameArchive(str(path)).get_winner(0) == -1
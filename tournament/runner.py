@@ -0,0 +1,468 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+import player.ai as ai
+from bench.runner import build_board, load_corpus, to_json_score
+from gameplay.base import board_classes
+from gameplay.record import GameEncoder, append_games
+from heuristics.sliding import Heuristics, build_heuristic
+from player.ordering import MoveOrdering
+from player.transposition import TranspositionTable
+
+# SearchEngine attributes which can be set in an engine spec, with their types
+engine_settings = {
+    "algorithm": str,
+    "depth": int,
+    "move_time": float,
+    "inplace_search": bool,
+    "threat_search": bool,
+    "threat_pruning": bool,
+    "symmetric_tt": bool,
+    "aspiration_window": float,
+    "book": bool,
+    "store": bool,
+}
+
+# first player to move, as in the gameplay
+first_color = -1
+
+winner_heuristic = build_heuristic(0, Heuristics.bin)
+
+
+def parse_bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"invalid bool: {value}")
+
+
+def parse_engine(spec: str) -> dict:
+    """
+    Parses "name:key=value,key=value", e.g. "pvs3:algorithm=pvs,depth=3",
+    keys are those of engine_settings
+    """
+    name, _, settings_str = spec.partition(":")
+    if not name:
+        raise argparse.ArgumentTypeError(f"engine without name: {spec}")
+
+    settings = {"name": name}
+    for item in filter(None, settings_str.split(",")):
+        key, _, value = item.partition("=")
+        if key not in engine_settings:
+            raise argparse.ArgumentTypeError(
+                f"unknown engine setting {key}, one of {', '.join(engine_settings)}"
+            )
+        value_type = engine_settings[key]
+        try:
+            settings[key] = (
+                parse_bool(value) if value_type is bool else value_type(value)
+            )
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid value of {key}: {value}")
+
+    if settings.get("algorithm", "minimax") not in ai.search_algorithms:
+        raise argparse.ArgumentTypeError(
+            f"algorithm must be one of {', '.join(ai.search_algorithms)}"
+        )
+    return settings
+
+
+class Contestant:
+    """
+    SearchEngine of one tournament engine. Transposition table, move ordering
+    and threat pruning are module globals of player.ai, so every contestant
+    keeps its own and puts them in place before searching, then engines
+    playing each other in one process do not share search results.
+    """
+
+    def __init__(self, settings: dict, tt_size_mb: float):
+        self.name = settings["name"]
+        self.move_time = settings.get("move_time")
+        self.threat_pruning = settings.get("threat_pruning", ai.threat_pruning)
+        self.symmetric_tt = settings.get("symmetric_tt", ai.symmetric_tt)
+
+        self.engine = ai.SearchEngine()
+        self.engine.max_workers = 1
+        self.engine.collect_stats = False
+        self.engine.calculation_depth = settings.get(
+            "depth", self.engine.calculation_depth
+        )
+        for key in (
+            "algorithm",
+            "inplace_search",
+            "threat_search",
+            "aspiration_window",
+        ):
+            setattr(self.engine, key, settings.get(key, getattr(self.engine, key)))
+        if not settings.get("book", True):
+            self.engine.opening_book = None
+        if not settings.get("store", True):
+            self.engine.result_store = None
+
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        self.move_ordering = MoveOrdering()
+
+    def activate(self):
+        ai.transposition_table = self.transposition_table
+        ai.move_ordering = self.move_ordering
+        ai.threat_pruning = self.threat_pruning
+        ai.symmetric_tt = self.symmetric_tt
+
+    def new_game(self):
+        self.activate()
+        self.engine.close()
+        self.engine.start()
+
+    def get_move(self, board, color: int) -> tuple[int, int] | None:
+        self.activate()
+        return self.engine.get_move(board, color, self.move_time)
+
+
+# contestants of a worker process by name, set by init_worker
+contestants: dict[str, Contestant] = {}
+
+
+def init_worker(engines: list[dict], tt_size_mb: float):
+    global contestants
+
+    contestants = {
+        settings["name"]: Contestant(settings, tt_size_mb) for settings in engines
+    }
+
+
+def get_random_opening(rng: np.random.Generator, n_moves: int) -> list[list[int]]:
+    """
+    :return: [x, y, color] of n_moves random moves, each next to the previous
+        stones or in the center square
+    """
+    board = build_board([])
+    moves = []
+    color = first_color
+    for _ in range(n_moves):
+        candidate_moves = ai.get_legal_moves(board, color, board.get_candidate_moves())
+        x, y = candidate_moves[rng.integers(len(candidate_moves))].tolist()
+        moves.append([x, y, color])
+        board = build_board(moves)
+        color = -color
+    return moves
+
+
+def play_game(task: dict) -> dict:
+    """
+    :param task: names of the engines playing first_color and the other color,
+        opening moves, board backend and max number of moves
+    """
+    board = board_classes[task["board_backend"]]()
+    record = GameEncoder()
+    for x, y, color in task["opening"]:
+        board = board.get_board_after_move(x, y, color)
+        board.update_double_free_three_count_and_check_if_violated(
+            ai.free_three_counter
+        )
+        record.add_move(board)
+    players = {first_color: task["first"], -first_color: task["second"]}
+    for name in players.values():
+        contestants[name].new_game()
+
+    move_times = {name: [] for name in players.values()}
+    color = -board.last_move_color if board.last_move_color else first_color
+    winner_color = None
+    reason = "max_moves"
+
+    while board.move_idx < task["max_moves"]:
+        name = players[color]
+        time_start = time.perf_counter()
+        move = contestants[name].get_move(board, color)
+        move_times[name].append(time.perf_counter() - time_start)
+
+        if move is None:
+            reason = "no_moves"
+            break
+
+        board_new = board.get_board_after_move(*move, color)
+        if board_new.update_double_free_three_count_and_check_if_violated(
+            ai.free_three_counter
+        ):
+            winner_color, reason = -color, "illegal_move"
+            break
+        board = board_new
+        record.add_move(board)
+
+        winner_color = board.winner(winner_heuristic)
+        if winner_color is not None:
+            reason = "win"
+            break
+        color = -color
+
+    return {
+        "game": task["game"],
+        "first": task["first"],
+        "second": task["second"],
+        "winner": None if winner_color is None else players[winner_color],
+        "reason": reason,
+        "moves": board.move_idx,
+        "move_times": {
+            name: float(np.sum(times)) for name, times in move_times.items()
+        },
+        "n_moves": {name: len(times) for name, times in move_times.items()},
+        "record": record.to_bytes(winner_color),
+    }
+
+
+def get_tasks(
+    engine_names: list[str],
+    games: int,
+    openings: list[list[list[int]]] | None,
+    random_opening_moves: int,
+    seed: int,
+    board_backend: str,
+    max_moves: int,
+) -> list[dict]:
+    """
+    Every pair of engines plays games games, every opening twice with colors
+    swapped
+    """
+    rng = np.random.default_rng(seed)
+    tasks = []
+    for name_a, name_b in itertools.combinations(engine_names, 2):
+        for game_idx in range(games):
+            if game_idx % 2 == 0:
+                if openings is not None:
+                    opening = openings[(game_idx // 2) % len(openings)]
+                else:
+                    opening = get_random_opening(rng, random_opening_moves)
+            first, second = (name_a, name_b) if game_idx % 2 == 0 else (name_b, name_a)
+            tasks.append(
+                {
+                    "game": len(tasks),
+                    "first": first,
+                    "second": second,
+                    "opening": opening,
+                    "board_backend": board_backend,
+                    "max_moves": max_moves,
+                }
+            )
+    return tasks
+
+
+def get_elo(score: float) -> float:
+    """
+    :param score: mean points per game, 1 for a win and 0.5 for a draw
+    :return: rating difference to the opponents which gives this expected score
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def get_elo_margin(points: list[float]) -> float:
+    """
+    :return: half width of the 95% confidence interval of get_elo of the mean
+        of points
+    """
+    if len(points) < 2:
+        return math.inf
+    score = float(np.mean(points))
+    score_error = 1.96 * float(np.std(points, ddof=1)) / math.sqrt(len(points))
+    # bounds are kept inside (0, 1) so that the margin stays finite
+    eps = 1 / (2 * len(points))
+    low = get_elo(min(max(score - score_error, eps), 1 - eps))
+    high = get_elo(min(max(score + score_error, eps), 1 - eps))
+    return (high - low) / 2
+
+
+def summarize(results: list[dict], engine_names: list[str]) -> list[dict]:
+    """
+    :return: row for every engine, with Elo relative to its opponents
+    """
+    rows = []
+    for name in engine_names:
+        games = [r for r in results if name in (r["first"], r["second"])]
+        points = [
+            1.0 if r["winner"] == name else 0.5 if r["winner"] is None else 0.0
+            for r in games
+        ]
+        n_moves = sum(r["n_moves"].get(name, 0) for r in games)
+        score = float(np.mean(points)) if points else 0.0
+        rows.append(
+            {
+                "engine": name,
+                "games": len(games),
+                "wins": sum(r["winner"] == name for r in games),
+                "losses": sum(r["winner"] not in (name, None) for r in games),
+                "draws": sum(r["winner"] is None for r in games),
+                "win_rate": points.count(1.0) / len(games) if games else 0.0,
+                "score": score,
+                "elo": get_elo(score) if games else 0.0,
+                "elo_margin": get_elo_margin(points),
+                "mean_move_time": (
+                    sum(r["move_times"].get(name, 0.0) for r in games) / n_moves
+                    if n_moves > 0
+                    else 0.0
+                ),
+                "mean_game_length": (
+                    float(np.mean([r["moves"] for r in games])) if games else 0.0
+                ),
+            }
+        )
+    return rows
+
+
+def format_table(rows: list[dict]) -> str:
+    header = (
+        f"{'engine':<16} {'games':>5} {'W':>4} {'L':>4} {'D':>4} {'win%':>6} "
+        f"{'score':>6} {'elo':>12} {'move s':>8} {'length':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        elo = f"{row['elo']:+.0f}±{row['elo_margin']:.0f}"
+        lines.append(
+            f"{row['engine']:<16} {row['games']:>5} {row['wins']:>4} "
+            f"{row['losses']:>4} {row['draws']:>4} {row['win_rate'] * 100:>5.1f}% "
+            f"{row['score']:>6.3f} {elo:>12} {row['mean_move_time']:>8.3f} "
+            f"{row['mean_game_length']:>7.1f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tournament",
+        description="Plays games between every pair of engines in parallel "
+        "processes and prints win rate, Elo, mean move time and game length",
+    )
+    parser.add_argument(
+        "--engine",
+        "-e",
+        type=parse_engine,
+        action="append",
+        dest="engines",
+        required=True,
+        help="name:key=value,... with keys "
+        f"{', '.join(engine_settings)}, e.g. pvs3:algorithm=pvs,depth=3. "
+        "Given at least twice",
+    )
+    parser.add_argument(
+        "--games", type=int, default=20, help="games of every pair of engines"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=os.cpu_count(), help="games played at once"
+    )
+    parser.add_argument(
+        "--openings",
+        type=str,
+        default=None,
+        help="corpus json, as of python -m bench, whose positions are played "
+        "in turn. Random openings if not set",
+    )
+    parser.add_argument(
+        "--random-opening-moves", type=int, default=3, dest="random_opening_moves"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--board-backend",
+        type=str,
+        choices=list(board_classes),
+        default="array",
+        dest="board_backend",
+    )
+    parser.add_argument(
+        "--max-moves",
+        type=int,
+        default=200,
+        dest="max_moves",
+        help="game is a draw after this many moves",
+    )
+    parser.add_argument("--tt-size-mb", type=float, default=16, dest="tt_size_mb")
+    parser.add_argument(
+        "--output", "-o", type=str, default=None, help="json file of all results"
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        help="record file to append the moves of all games to, see gameplay.record",
+    )
+    args = parser.parse_args()
+
+    engine_names = [settings["name"] for settings in args.engines]
+    if len(engine_names) < 2 or len(set(engine_names)) != len(engine_names):
+        parser.error("at least two engines with different names are needed")
+    return args
+
+
+def main():
+    args = parse_args()
+    engine_names = [settings["name"] for settings in args.engines]
+
+    openings = None
+    if args.openings is not None:
+        openings = [
+            position["moves"]
+            for position in load_corpus(args.openings)["positions"]
+            if position["moves"] is not None
+        ]
+
+    tasks = get_tasks(
+        engine_names,
+        args.games,
+        openings,
+        args.random_opening_moves,
+        args.seed,
+        args.board_backend,
+        args.max_moves,
+    )
+
+    time_start = time.monotonic()
+    results = []
+    with Pool(
+        processes=min(args.processes, len(tasks)),
+        initializer=init_worker,
+        initargs=(args.engines, args.tt_size_mb),
+    ) as pool:
+        for result in pool.imap_unordered(play_game, tasks):
+            results.append(result)
+            print(
+                f"[{len(results)}/{len(tasks)}] {result['first']} - {result['second']}: "
+                f"{result['winner'] or 'draw'} ({result['reason']}, "
+                f"{result['moves']} moves)",
+                file=sys.stderr,
+            )
+
+    results.sort(key=lambda r: r["game"])
+    records = [result.pop("record") for result in results]
+    if args.record is not None:
+        append_games(args.record, records)
+    rows = summarize(results, engine_names)
+    print(format_table(rows))
+    print(f"{len(results)} games in {time.monotonic() - time_start:.1f}s")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "engines": args.engines,
+                    "summary": [
+                        row
+                        | {
+                            "elo": to_json_score(row["elo"]),
+                            "elo_margin": to_json_score(row["elo_margin"]),
+                        }
+                        for row in rows
+                    ],
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )